@@ -0,0 +1,338 @@
+# coding=utf-8
+"""
+Benchmarks for the word-o-mat hot paths.
+
+Runs headlessly (no Glyphs needed) against the bundled dictionaries and a
+synthetic font, and reports p50/p95 latency, words/sec and peak memory per
+benchmark, compared to a stored baseline:
+
+    python benchmarks/bench.py                  # run all, compare to benchmarks/baseline.json
+    python benchmarks/bench.py --filter check/  # only the wordChecker benchmarks
+    python benchmarks/bench.py --save           # add benchmarks missing from the baseline to it
+    python benchmarks/bench.py --save --overwrite --filter check/   # record these benchmarks again
+
+Timings depend on the machine, so compare against a baseline recorded on the
+same machine. All random choices use fixed seeds. Existing baseline numbers are
+only replaced with --overwrite: record them on the tree before a change, so the
+baseline shows what the change gained.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+here = os.path.dirname(os.path.abspath(__file__))
+resources = os.path.join(os.path.dirname(here), "word-o-mat.glyphsPlugin", "Contents", "Resources")
+sys.path.insert(0, resources)
+
+import wordcheck  # noqa: E402
+import worddicts  # noqa: E402
+import wordengine  # noqa: E402
+import wordgrep  # noqa: E402
+import wordmetrics  # noqa: E402
+import wordwidth  # noqa: E402
+
+dictFolder = os.path.join(resources, "dictionaries")
+defaultBaseline = os.path.join(here, "baseline.json")
+lowercase = "abcdefghijklmnopqrstuvwxyz"
+
+
+class Benchmark(object):
+    """One benchmark.
+
+    Attributes:
+    name (str):     Name, "group/case".
+    run (func):     Called with the result of setup(); returns the number of words processed.
+    setup (func):   Called before every run, untimed; None if nothing needs to be set up.
+    warmUp (Bool):  Signals whether to do one untimed run first, e.g. to build indexes and caches.
+    """
+
+    def __init__(self, name, run, setup=None, warmUp=True):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.warmUp = warmUp
+
+
+def percentile(values, fraction):
+    """Return the value at a fraction of the sorted values (nearest rank)."""
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def measure(benchmark, repeat, minSampleTime=0.05):
+    """Run a benchmark repeat times and return its stats; peak memory comes from one extra, untimed run.
+
+    Fast benchmarks without a setup are looped within each timed sample until it takes at least
+    minSampleTime, and the time per run is reported, which keeps the timer resolution and noise out.
+    """
+    times = []
+    words = 0
+    loops = 1
+    if benchmark.warmUp:
+        start = time.perf_counter()
+        benchmark.run(benchmark.setup() if benchmark.setup else None)
+        elapsed = time.perf_counter() - start
+        if benchmark.setup is None and elapsed < minSampleTime:
+            loops = int(minSampleTime / max(elapsed, 1e-6)) + 1
+    for i in range(repeat):
+        arg = benchmark.setup() if benchmark.setup else None
+        start = time.perf_counter()
+        for j in range(loops):
+            words = benchmark.run(arg)
+        times.append((time.perf_counter() - start) / loops)
+    arg = benchmark.setup() if benchmark.setup else None
+    tracemalloc.start()
+    benchmark.run(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    p50 = percentile(times, 0.5)
+    return {
+        "p50": p50,
+        "p95": percentile(times, 0.95),
+        "wordsPerSec": words / p50 if p50 else 0.0,
+        "peakKB": peak // 1024,
+    }
+
+
+# ---- synthetic font
+
+def syntheticMetrics(chars, seed=1):
+    """Return FontMetrics with advances, kerning groups and kerning shaped like a real text font.
+
+    Characters are put into kerning groups by their base letter (case folded, diacritics removed);
+    about a third of all group pairs are kerned, plus a few hundred glyph exceptions.
+    """
+    import unicodedata
+    rng = random.Random(seed)
+    chars = sorted(chars)
+    advances = {}
+    kerningKeys = {}
+    groups = set()
+    for c in chars:
+        advances[c] = rng.randint(250, 750) if not c.isupper() else rng.randint(450, 850)
+        base = unicodedata.normalize("NFD", c)[0]
+        group = base.upper() if c.isupper() else base
+        groups.add(group)
+        kerningKeys[c] = ("glyph_%04X" % ord(c), "@MMK_L_" + group, "@MMK_R_" + group)
+    kerning = {}
+    groups = sorted(groups)
+    for left in groups:
+        for right in groups:
+            if rng.random() < 0.33:
+                kerning[("@MMK_L_" + left, "@MMK_R_" + right)] = rng.randint(-80, 30)
+    for i in range(300):
+        left, right = rng.choice(chars), rng.choice(chars)
+        kerning[(kerningKeys[left][0], kerningKeys[right][0])] = rng.randint(-60, 20)
+    return wordmetrics.FontMetrics(advances, kerningKeys, kerning)
+
+
+# ---- benchmarks
+
+def loadBenchmarks(registry, warmCache):
+    """Loading the wordlists of each writing system: compiling them (cold) and mapping them (warm)."""
+    benchmarks = []
+    for writingSystem in registry.writingSystems:
+        languages = registry.languagesByWS[writingSystem]
+
+        def coldSetup():
+            return tempfile.mkdtemp(prefix="womc-bench-")
+
+        def coldRun(cacheFolder, writingSystem=writingSystem, languages=languages):
+            try:
+                cold = worddicts.DictionaryRegistry(dictFolder, maxEntries=0, userDict=None, cacheFolder=cacheFolder)
+                return sum(len(cold.get(writingSystem, language)) for language in languages)
+            finally:
+                shutil.rmtree(cacheFolder, ignore_errors=True)
+
+        def warmRun(arg, writingSystem=writingSystem, languages=languages):
+            warm = worddicts.DictionaryRegistry(dictFolder, maxEntries=0, userDict=None, cacheFolder=warmCache)
+            return sum(len(warm.get(writingSystem, language)) for language in languages)
+
+        benchmarks.append(Benchmark("load/cold/%s" % writingSystem, coldRun, coldSetup, warmUp=False))
+        benchmarks.append(Benchmark("load/warm/%s" % writingSystem, warmRun))
+    return benchmarks
+
+
+def checkBenchmarks(words):
+    """wordChecker.checkWord throughput over the whole English list in random order, per match mode."""
+    words = list(words)  # decode the words once, so only the checks are timed
+    random.Random(1).shuffle(words)  # in the order the engine samples them, not sorted by length
+    cases = [
+        ("text-required", dict(requiredLetters=["k"])),
+        ("text-groups", dict(requiredGroups=[["a", "e"], ["r", "s", "t"]])),
+        ("text-charset", dict(limitToCharset=True, customCharset=list(lowercase[:16]))),
+        ("banRepetitions", dict(banRepetitions=True)),
+        ("grep-anchored", dict(matchMode="grep", matchPattern="^st.*ing$")),
+        ("grep-unanchored", dict(matchMode="grep", matchPattern=".+p.+")),
+        ("grep-class", dict(matchMode="grep", matchPattern="f[bhkl]")),
+        ("required-banRepetitions", dict(requiredLetters=["q"], banRepetitions=True)),
+        ("charset-grep-permissive", dict(limitToCharset=True, customCharset=list(lowercase[:16]),
+                                         matchMode="grep", matchPattern="^.+$", banRepetitions=True)),
+    ]
+    benchmarks = []
+    for name, options in cases:
+        settings = dict(limitToCharset=False, customCharset=[], requiredLetters=[], requiredGroups=[[], [], []],
+                        matchMode="text", matchPattern="", banRepetitions=False)
+        settings.update(options)
+        pattern = wordgrep.compilePattern(settings["matchPattern"]).regex if settings["matchMode"] == "grep" else None
+        checker = wordcheck.wordChecker(settings["limitToCharset"], [], settings["customCharset"],
+                                        settings["requiredLetters"], settings["requiredGroups"], pattern,
+                                        settings["banRepetitions"], 3, 15, matchMode=settings["matchMode"],
+                                        adaptive=True)
+
+        def run(arg, checker=checker):
+            checkWord = checker.checkWord
+            found = set()
+            for w in words:
+                checkWord(w, found)
+            return len(words)
+        benchmarks.append(Benchmark("check/%s" % name, run))
+    return benchmarks
+
+
+def generateBenchmarks(engine):
+    """End-to-end generation through the engine for a few typical settings."""
+    cases = [
+        ("20-words", dict(wordCount=20)),
+        ("200-words-5-8", dict(wordCount=200, minLength=5, maxLength=8)),
+        ("2000-words", dict(wordCount=2000)),
+        ("20-words-charset", dict(wordCount=20, charset=lowercase[:16])),
+        ("20-words-required", dict(wordCount=20, requiredLetters="q, z")),
+        ("20-words-grep", dict(wordCount=20, matchMode="grep", matchPattern="^t.*n{2}")),
+        ("20-words-caps", dict(wordCount=20, case="upper", charset=lowercase.upper())),
+        ("count-charset", dict(charset=lowercase[:10], total=True)),
+    ]
+    benchmarks = []
+    for name, spec in cases:
+        spec = dict(spec, dictionary="Latin/English", seed=1)
+        total = spec.pop("total", False)
+        query = wordengine.WordQuery.fromDict(spec)
+        if total:
+            def run(arg, query=query):
+                engine.countMatches(query)
+                return 1
+        else:
+            def run(arg, query=query):
+                return len(engine.generate(query))
+        benchmarks.append(Benchmark("generate/%s" % name, run))
+    return benchmarks
+
+
+def widthBenchmarks(words, metrics):
+    """Sorting output by width, and measuring a whole list at once."""
+    rng = random.Random(2)
+    sample = rng.sample(list(words), 2000)
+
+    def sortRun(arg):
+        metrics.pairs.clear()
+        metrics.sortByWidth(sample)
+        return len(sample)
+
+    def tableRun(arg):
+        metrics.pairs.clear()
+        wordwidth.WidthTable(words, metrics)
+        return len(words)
+    return [Benchmark("width/sort-2000", sortRun), Benchmark("width/table-English", tableRun)]
+
+
+def lineBenchmarks(engine, metrics):
+    """Filling lines of a given width (see wordlines), over all words and over a restricted charset."""
+    cases = [
+        ("20-lines-6000", dict(), 6000, 10),
+        ("20-lines-20000-exact", dict(), 20000, 0),
+        ("20-lines-charset", dict(charset=lowercase[:16]), 6000, 10),
+        ("20-lines-caps", dict(case=3, maxLength=8), 6000, 10),
+    ]
+    benchmarks = []
+    for name, options, width, tolerance in cases:
+        query = wordengine.WordQuery("Latin", "English", seed=1, **options)
+
+        def run(arg, query=query, width=width, tolerance=tolerance):
+            return sum(len(line) for line in engine.fitLines(query, metrics, width, 20, tolerance))
+        benchmarks.append(Benchmark("lines/%s" % name, run))
+    return benchmarks
+
+
+# ---- report
+
+def compare(results, baseline, threshold):
+    """Print a table of the results against the baseline; return the names of regressed benchmarks."""
+    regressions = []
+    print("%-30s %10s %10s %14s %10s %9s" % ("benchmark", "p50 ms", "p95 ms", "words/sec", "peak KB", "vs base"))
+    for name, stats in results.items():
+        base = baseline.get(name)
+        change = ""
+        if base and base.get("p50"):
+            delta = stats["p50"] / base["p50"] - 1.0
+            change = "%+.0f%%" % (100 * delta)
+            if delta > threshold:
+                change += " !"
+                regressions.append(name)
+        print("%-30s %10.2f %10.2f %14s %10d %9s" % (name, 1000 * stats["p50"], 1000 * stats["p95"],
+                                                   "{:,.0f}".format(stats["wordsPerSec"]), stats["peakKB"], change))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark the word-o-mat hot paths.")
+    parser.add_argument("--repeat", type=int, default=7, help="timed runs per benchmark")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--baseline", default=defaultBaseline, help="baseline JSON file to compare against")
+    parser.add_argument("--save", action="store_true", help="add the results of new benchmarks to the baseline")
+    parser.add_argument("--overwrite", action="store_true", help="with --save, replace existing baseline numbers too")
+    parser.add_argument("--threshold", type=float, default=0.25, help="p50 slowdown reported as a regression")
+    options = parser.parse_args(args)
+
+    warmCache = tempfile.mkdtemp(prefix="womc-bench-")
+    try:
+        registry = worddicts.DictionaryRegistry(dictFolder, maxEntries=0, userDict=None, cacheFolder=warmCache)
+        engine = wordengine.WordEngine(registry)
+        words = registry.get("Latin", "English")
+        for writingSystem in registry.writingSystems:
+            for language in registry.languagesByWS[writingSystem]:
+                registry.get(writingSystem, language)  # compile everything once for the warm benchmarks
+        metrics = syntheticMetrics(set("".join(words)) | set(lowercase.upper()) | {" "})
+
+        benchmarks = (loadBenchmarks(registry, warmCache) + checkBenchmarks(words) + generateBenchmarks(engine) +
+                      widthBenchmarks(words, metrics) + lineBenchmarks(engine, metrics))
+        results = {}
+        for benchmark in benchmarks:
+            if options.filter in benchmark.name:
+                results[benchmark.name] = measure(benchmark, options.repeat)
+    finally:
+        shutil.rmtree(warmCache, ignore_errors=True)
+
+    baseline = {}
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as fo:
+            baseline = json.load(fo).get("results", {})
+    print("word-o-mat benchmarks, Python %s on %s" % (platform.python_version(), platform.platform()))
+    regressions = compare(results, baseline, options.threshold)
+
+    if options.save:
+        added = [name for name in results if options.overwrite or name not in baseline]
+        for name in added:
+            baseline[name] = results[name]
+        print("%d benchmark(s) saved, %d kept as they were" % (len(added), len(results) - len(added)))
+        data = {"python": platform.python_version(), "platform": platform.platform(), "results": baseline}
+        with open(options.baseline, "w") as fo:
+            json.dump(data, fo, indent=1, sort_keys=True)
+        print("baseline saved to %s" % options.baseline)
+    elif regressions:
+        print("%d benchmark(s) more than %.0f%% slower than the baseline" % (len(regressions), 100 * options.threshold))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,8 @@
+# coding=utf-8
+"""Make the plugin's headless modules importable from the tests, as benchmarks/bench.py does."""
+import os
+import sys
+
+resources = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "word-o-mat.glyphsPlugin", "Contents", "Resources")
+sys.path.insert(0, resources)
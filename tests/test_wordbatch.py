@@ -0,0 +1,27 @@
+# coding=utf-8
+import pytest
+
+import wordbatch
+import wordengine
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    return wordengine.WordEngine.fromFolder(cacheFolder=str(tmp_path_factory.mktemp("cache")), userDict=None,
+                                            importFolder=str(tmp_path_factory.mktemp("imports")))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_bad_spec_fails_only_its_own_job(engine, workers):
+    specs = [
+        {"dictionary": "Latin/English", "wordCount": 5},
+        {"dictionary": "Latin/English", "wordCount": 5, "minLength": [3]},  # TypeError
+        {"dictionary": ["Latin/English"], "wordCount": 5},
+        {"dictionary": "Latin/English", "wordCount": 5, "requiredLetters": "e"},
+    ]
+    jobs = wordbatch.expandJobs(specs, engine.dictionaries)
+    results = list(wordbatch.runJobs(engine, jobs, seed=1, workers=workers))
+    assert [r["id"] for r in results] == [0, 1, 2, 3]
+    assert "error" not in results[0] and len(results[0]["words"]) == 5
+    assert "error" in results[1] and "error" in results[2]
+    assert all("e" in w for w in results[3]["words"])
@@ -0,0 +1,35 @@
+# coding=utf-8
+import io
+import random
+
+import pytest
+
+import wordcache
+import wordimport
+
+
+def importWords(tmp_path, text, **options):
+    source = tmp_path / "corpus.txt"
+    with io.open(str(source), "w", encoding="utf-8") as fo:
+        fo.write(text)
+    importer = wordimport.CorpusImporter(str(source), str(tmp_path / "corpus.wordlist"), **options)
+    importer.run()
+    return set(wordcache.MappedWordList(importer.destPath))
+
+
+def expectedWords(text, maxLength=40):
+    return set(w for w in wordimport.tokenize(text, maxLength) if wordimport.isWord(w))
+
+
+@pytest.mark.parametrize("chunkSize", [7, 64, 1000])
+def test_words_are_not_split_without_white_space(tmp_path, chunkSize):
+    rng = random.Random(1)
+    vocabulary = ["".join(rng.choice(u"abcdéfghij") for _ in range(rng.randint(2, 12))) for _ in range(300)]
+    separators = [u",", u";", u"1", u"42", u".", u"—", u"/"]
+    text = u"".join(rng.choice(vocabulary) + rng.choice(separators) for _ in range(5000))
+    assert importWords(tmp_path, text, chunkSize=chunkSize) == expectedWords(text)
+
+
+def test_tokens_too_long_are_dropped_whole(tmp_path):
+    text = u"short," + u"x" * 100 + u"tail,end"
+    assert importWords(tmp_path, text, chunkSize=16, maxLength=20) == {u"short", u"end"}
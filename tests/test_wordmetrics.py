@@ -0,0 +1,49 @@
+# coding=utf-8
+import wordmetrics
+
+
+class FakeLayer(object):
+    def __init__(self, width):
+        self.width = width
+
+
+class FakeGlyph(object):
+    def __init__(self, char, width):
+        self.name = self.id = char
+        self.unicode = "%04X" % ord(char)
+        self.leftKerningGroup = self.rightKerningGroup = char
+        self.layers = {"m01": FakeLayer(width)}
+
+    def charString(self):
+        return chr(int(self.unicode, 16))
+
+
+class FakeMaster(object):
+    id = "m01"
+
+
+class FakeFont(object):
+    def __init__(self):
+        self.glyphs = [FakeGlyph("A", 600), FakeGlyph("V", 580)]
+        self.masters = [FakeMaster()]
+        self.kerning = {"m01": {"@MMK_L_A": {"@MMK_R_V": -40}}}
+
+
+def test_kerning_edit_reaches_cached_metrics():
+    font = FakeFont()
+    try:
+        assert wordmetrics.fontMetrics(font).kern("A", "V") == -40
+        font.kerning["m01"]["@MMK_L_A"]["@MMK_R_V"] = -70  # same keys, new value
+        assert wordmetrics.fontMetrics(font).kern("A", "V") == -70
+        font.kerning["m01"]["@MMK_L_V"] = {"@MMK_R_A": -25}
+        assert wordmetrics.fontMetrics(font).kern("V", "A") == -25
+    finally:
+        wordmetrics.invalidateMetrics(font)
+
+
+def test_unchanged_kerning_keeps_cached_metrics():
+    font = FakeFont()
+    try:
+        assert wordmetrics.fontMetrics(font) is wordmetrics.fontMetrics(font)
+    finally:
+        wordmetrics.invalidateMetrics(font)
@@ -15,30 +15,50 @@ from __future__ import print_function
 
 import os
 
-import codecs
-import random
 import re
+import traceback
 import webbrowser
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
 
 from lib import addObserver, removeObserver, CurrentFont, registerExtensionDefaults, getExtensionDefault, setExtensionDefault, ExtensionBundle, OpenSpaceCenter, AllFonts, AccordionView
 # from vanilla.dialogs import getFile # open dialog from the vanilla version used in Glyphs 2 is not working in 10.15 (and above) any more. So if we drop Glyphs 2 support, this can be reverted
 from GlyphsApp import GetOpenFile, Message
 from vanilla import Window, Button, PopUpButton, SegmentedButton, Group, Box, TextBox, EditText, CheckBox, ComboBox
-
-from random import choice
-import wordcheck
+from PyObjCTools.AppHelper import callAfter, callLater
+
+import wordcache
+import worddicts
+import wordengine
+import wordgrep
+import wordimport
+import wordmetrics
+import wordpreview
+import wordstats
+from wordengine import ransom
 warned = False
+outputChunkSize = 500  # words produced at a time; the Edit tab is updated whenever the words shown have doubled
+previewDelay = 0.3  # seconds without edits before the match preview is updated
+importItem = u"Import corpus…"  # last item of the writing system pop-up
+maxWatchedGlyphs = 100  # selected glyphs compared on every interface update; larger selections aren't watched
 
 
 class WordomatWindow:
 
     def writingSystemCallback(self, sender):
-        """Called when the writing system selection changes."""
+        """Called when the writing system selection changes; the last item imports a corpus instead."""
         selectedWS = sender.getItem()
+        if selectedWS == importItem:
+            if self.currentWS in self.writingSystems:
+                sender.set(self.writingSystems.index(self.currentWS))
+            self.importCorpus()
+            return
         self.updateLanguagePopUp(selectedWS)
+        self.settingsChanged()
 
     def updateLanguagePopUp(self, writingSystem):
         """Update the language pop-up based on the selected writing system."""
+        self.currentWS = writingSystem
         languages = self.languagesByWS.get(writingSystem, [])
         self.g1.language.setItems(languages)
         # Optionally, select the first language if available
@@ -46,26 +66,32 @@ class WordomatWindow:
             self.g1.language.set(0)
 
     def languageCallback(self, sender):
-        """Called when the language selection changes (if needed for future use)."""
-        pass
+        """Called when the language selection changes; the preview loads the selected wordlist in the background."""
+        self.settingsChanged()
 
     def __init__(self):
         """Initialize word-o-mat UI, open the window."""
         # load preferences and dictionaries
         self.loadPrefs()
         self.loadDictionaries()
+        self.run = None  # WordStream of the generation running in the background, if any
+        self.importer = None  # CorpusImporter running in the background, if any
+        self.currentWS = None  # writing system whose languages are shown
+        self.previewToken = 0  # increased with every edit; previews of older settings are dropped
+        self.previewExecutor = ThreadPoolExecutor(max_workers=1)
 
         # Observers for font events
-        addObserver(self, lambda: self.g1.base.enable(True), "fontDidOpen")
+        addObserver(self, lambda info: self.g1.base.enable(True), "fontDidOpen")
         addObserver(self, "fontClosed", "fontWillClose")
+        addObserver(self, "glyphChanged", "glyphChanged")
 
         # Build the window and UI
-        self.w = Window((250, 430), 'word-o-mat')
+        self.w = Window((250, 582), 'word-o-mat')
         padd, bPadd = 12, 3
         groupW = 250 - 2 * padd  # group width
 
         # Increase the height of the basic settings group to accommodate all elements.
-        self.g1 = Group((padd, 2, groupW, 100))
+        self.g1 = Group((padd, 2, groupW, 110))
 
         # Top line fields (word count, min length, max length)
         topLineFields = {
@@ -80,17 +106,21 @@ class WordomatWindow:
         }
 
         for label, values in topLineFields.items():
-            setattr(self.g1, label, EditText((values[0], 0, values[1], 22), text=values[2], placeholder=str(values[3])))
+            callback = self.settingsChanged if label != "wordCount" else None
+            setattr(self.g1, label, EditText((values[0], 0, values[1], 22), text=values[2], placeholder=str(values[3]),
+                                             callback=callback))
 
         for label, values in topLineLabels.items():
             setattr(self.g1, label, TextBox((values[0], 3, values[1], 22), text=values[2], alignment=values[3]))
+        # exact number of matching words in the dictionary, updated as the settings are edited and after each run
+        self.g1.matchCount = TextBox((0, 23, -0, 12), "", sizeStyle="mini")
 
         # --- New UI Elements for Writing System and Language selection ---
-        self.g1.writingSystem = PopUpButton((0, 29, 110, 20),
-                                            self.writingSystems,
+        self.g1.writingSystem = PopUpButton((0, 39, 110, 20),
+                                            self.writingSystems + [importItem],
                                             callback=self.writingSystemCallback,
                                             sizeStyle="small")
-        self.g1.language = PopUpButton((116, 29, 110, 20),
+        self.g1.language = PopUpButton((116, 39, 110, 20),
                                        [],
                                        callback=self.languageCallback,
                                        sizeStyle="small")
@@ -101,7 +131,7 @@ class WordomatWindow:
 
         ransom_note = ransom("ransom note")
         caseList = ["Keep case", "make lowercase", "Capitalize", "ALL CAPS", ransom_note]
-        self.g1.case = PopUpButton((0, 52, groupW, 20), caseList, sizeStyle="small")
+        self.g1.case = PopUpButton((0, 62, groupW, 20), caseList, callback=self.settingsChanged, sizeStyle="small")
         self.g1.case.set(self.case)
 
         charsetList = [
@@ -109,7 +139,7 @@ class WordomatWindow:
             "Use characters in current font",
             "Use only selected glyphs",
         ]
-        self.g1.base = PopUpButton((0, 75, groupW, 20), charsetList, sizeStyle="small")
+        self.g1.base = PopUpButton((0, 85, groupW, 20), charsetList, callback=self.settingsChanged, sizeStyle="small")
         if not CurrentFont():
             self.g1.base.set(0)  # Use any characters
             self.g1.base.enable(False)  # Disable selection if no font is open
@@ -117,7 +147,7 @@ class WordomatWindow:
             self.g1.base.set(self.limitToCharset)
 
         # Panel 2 - Match letters
-        self.g2 = Group((0, 2, 250, 172))
+        self.g2 = Group((0, 2, 250, 212))
 
         # Match mode selection
         matchBtnItems = [
@@ -130,14 +160,15 @@ class WordomatWindow:
         self.g2.matchMode.set(rePanelOn)
 
         # Text/List match mode panel
-        self.g2.textMode = Box((padd, 29, -padd, 133))
-        labelY = [2, 42]
-        labelText = ["Require these letters in each word:", "Require one per group in each word:"]
-        for i in range(2):
+        self.g2.textMode = Box((padd, 29, -padd, 173))
+        labelY = [2, 42, 122]
+        labelText = ["Require these letters in each word:", "Require one per group in each word:",
+                     "Require these sequences in each word:"]
+        for i in range(3):
             setattr(self.g2.textMode, "reqLabel%s" % i,
                     TextBox((bPadd, labelY[i], -bPadd, 22), labelText[i], sizeStyle="small"))
         self.g2.textMode.mustLettersBox = EditText((bPadd + 2, 18, -bPadd, 19), text=", ".join(self.requiredLetters),
-                                                   sizeStyle="small")
+                                                   callback=self.settingsChanged, sizeStyle="small")
         y2 = 36
         attrNameTemplate = "group%sbox"
         for i in range(3):
@@ -147,16 +178,21 @@ class WordomatWindow:
             if len(self.requiredGroups[i]) > 0 and self.requiredGroups[i][0] != "":
                 optionsList.insert(0, "Recent: " + ", ".join(self.requiredGroups[i]))
             attrName = attrNameTemplate % j
-            setattr(self.g2.textMode, attrName, ComboBox((bPadd + 2, y2, -bPadd, 19), optionsList, sizeStyle="small"))
+            setattr(self.g2.textMode, attrName, ComboBox((bPadd + 2, y2, -bPadd, 19), optionsList,
+                                                         callback=self.settingsChanged, sizeStyle="small"))
         groupBoxes = [self.g2.textMode.group1box, self.g2.textMode.group2box, self.g2.textMode.group3box]
         for i in range(3):
             if len(self.requiredGroups[i]) > 0 and self.requiredGroups[i][0] != "":
                 groupBoxes[i].set(", ".join(self.requiredGroups[i]))
+        self.g2.textMode.sequencesBox = EditText((bPadd + 2, 138, -bPadd, 19), text=self.requiredSequences,
+                                                 placeholder="e.g. Ty, rn, ffi", callback=self.settingsChanged,
+                                                 sizeStyle="small")
 
         # GREP match mode panel
-        self.g2.grepMode = Box((padd, 29, -padd, 133))
+        self.g2.grepMode = Box((padd, 29, -padd, 173))
         self.g2.grepMode.label = TextBox((bPadd, 2, -bPadd, 22), "Regular expression to match:", sizeStyle="small")
-        self.g2.grepMode.grepBox = EditText((bPadd + 2, 18, -bPadd, 19), text=self.matchPattern, sizeStyle="small")
+        self.g2.grepMode.grepBox = EditText((bPadd + 2, 18, -bPadd, 19), text=self.matchPattern,
+                                            callback=self.settingsChanged, sizeStyle="small")
         splainstring = u"This uses Python’s internal re parser.\nExamples:\nf[bhkl] = words with f followed by b, h, k, or l\n.+p.+ = words with p inside them\n^t.*n{2}$ = words starting with t, ending in nn"
         self.g2.grepMode.explainer = TextBox((bPadd, 42, -bPadd, 80), splainstring, sizeStyle="mini")
         self.g2.grepMode.refButton = Button((bPadd, 108, -bPadd, 14), "go to syntax reference", sizeStyle="mini",
@@ -165,15 +201,36 @@ class WordomatWindow:
         self.toggleMatchModeFields()  # Switch to text or grep panel depending on matchMode
 
         # Panel 3 - Options
-        self.g3 = Group((padd, 8, groupW, 48))
+        self.g3 = Group((padd, 8, groupW, 150))
         self.g3.checkbox0 = CheckBox((bPadd, 0, -bPadd, 18), "No repeating characters per word", sizeStyle="small",
-                                     value=self.banRepetitions)
+                                     value=self.banRepetitions, callback=self.settingsChanged)
         self.g3.listOutput = CheckBox((bPadd, 20, -bPadd, 18), "Output as list sorted by width", sizeStyle="small")
+        self.g3.allMatches = CheckBox((bPadd, 40, -bPadd, 18), "Output all matching words", sizeStyle="small")
+        # line fitting: lines of words as wide as the given width (in units, with the spaces) +/- the tolerance
+        self.g3.fitLines = CheckBox((bPadd, 61, 36, 18), "Fit", sizeStyle="small")
+        self.g3.lineCount = EditText((40, 60, 28, 19), text=self.lineCount, placeholder="10", sizeStyle="small")
+        self.g3.linesText = TextBox((71, 63, 44, 17), "lines of", sizeStyle="small")
+        self.g3.lineWidth = EditText((115, 60, 44, 19), text=self.lineWidth, placeholder="5000", sizeStyle="small")
+        self.g3.toleranceText = TextBox((161, 63, 12, 17), u"±", sizeStyle="small")
+        self.g3.lineTolerance = EditText((174, 60, 34, 19), text=self.lineTolerance, placeholder="20",
+                                         sizeStyle="small")
+        # pair coverage: few words that together contain every pair given (or every kerned pair)
+        self.g3.coverPairs = CheckBox((bPadd, 83, 84, 18), "Cover pairs:", sizeStyle="small")
+        self.g3.pairs = EditText((88, 82, -bPadd, 19), text=self.pairs, placeholder="all kerned pairs",
+                                 sizeStyle="small")
+        self.g3.kerningGroups = CheckBox((bPadd + 18, 104, -bPadd, 18), "Collapse to kerning groups",
+                                         sizeStyle="small")
+        # width range: words as wide as minWidth to maxWidth units, or the words closest to one width if both are equal
+        self.g3.widthRange = CheckBox((bPadd, 127, 56, 18), "Width", sizeStyle="small")
+        self.g3.minWidth = EditText((60, 126, 44, 19), text=self.minWidth, placeholder="2000", sizeStyle="small")
+        self.g3.widthToText = TextBox((107, 129, 16, 17), "to", sizeStyle="small")
+        self.g3.maxWidth = EditText((124, 126, 44, 19), text=self.maxWidth, placeholder="2400", sizeStyle="small")
+        self.g3.unitsText = TextBox((171, 129, -bPadd, 17), "units", sizeStyle="small")
 
         accItems = [
-            dict(label="Basic settings", view=self.g1, size=105, collapsed=False, canResize=False),
-            dict(label="Specify required letters", view=self.g2, size=173, collapsed=False, canResize=False),
-            dict(label="Options", view=self.g3, size=48, collapsed=False, canResize=False)
+            dict(label="Basic settings", view=self.g1, size=115, collapsed=False, canResize=False),
+            dict(label="Specify required letters", view=self.g2, size=213, collapsed=False, canResize=False),
+            dict(label="Options", view=self.g3, size=150, collapsed=False, canResize=False)
         ]
         self.w.panel1 = Group((0, 0, 250, -35))
         self.w.panel1.accView = AccordionView((0, 0, -0, -0), accItems)
@@ -182,6 +239,7 @@ class WordomatWindow:
         self.w.bind("close", self.windowClose)
         self.w.setDefaultButton(self.w.submit)
         self.w.open()
+        self.settingsChanged()
 
     def loadPrefs(self):
         """Load the saved preferences into the program."""
@@ -209,6 +267,16 @@ class WordomatWindow:
             "com.ninastoessinger.word-o-mat.matchMode": "text",
             "com.ninastoessinger.word-o-mat.matchPattern": "",
             "com.ninastoessinger.word-o-mat.markColor": "None",
+            "com.ninastoessinger.word-o-mat.dictCacheEntries": 4,
+            "com.ninastoessinger.word-o-mat.dictCacheMB": 256,
+            "com.ninastoessinger.word-o-mat.instrumentation": "False",
+            "com.ninastoessinger.word-o-mat.lineCount": 10,
+            "com.ninastoessinger.word-o-mat.lineWidth": 5000,
+            "com.ninastoessinger.word-o-mat.lineTolerance": 20,
+            "com.ninastoessinger.word-o-mat.pairs": "",
+            "com.ninastoessinger.word-o-mat.requiredSequences": "",
+            "com.ninastoessinger.word-o-mat.minWidth": 2000,
+            "com.ninastoessinger.word-o-mat.maxWidth": 2400,
         }
         registerExtensionDefaults(initialDefaults)
 
@@ -222,14 +290,31 @@ class WordomatWindow:
             "matchMode": "com.ninastoessinger.word-o-mat.matchMode",
             "matchPattern": "com.ninastoessinger.word-o-mat.matchPattern",
             "reqMarkColor": "com.ninastoessinger.word-o-mat.markColor",
-            "source": "com.ninastoessinger.word-o-mat.source"  # <-- Added this line
+            "source": "com.ninastoessinger.word-o-mat.source",  # <-- Added this line
+            "dictCacheEntries": "com.ninastoessinger.word-o-mat.dictCacheEntries",
+            "dictCacheMB": "com.ninastoessinger.word-o-mat.dictCacheMB",
+            "instrumentation": "com.ninastoessinger.word-o-mat.instrumentation",
+            "lineCount": "com.ninastoessinger.word-o-mat.lineCount",
+            "lineWidth": "com.ninastoessinger.word-o-mat.lineWidth",
+            "lineTolerance": "com.ninastoessinger.word-o-mat.lineTolerance",
+            "pairs": "com.ninastoessinger.word-o-mat.pairs",
+            "requiredSequences": "com.ninastoessinger.word-o-mat.requiredSequences",
+            "minWidth": "com.ninastoessinger.word-o-mat.minWidth",
+            "maxWidth": "com.ninastoessinger.word-o-mat.maxWidth",
         }
         for variableName, pref in prefsToLoad.items():
             setattr(self, variableName, getExtensionDefault(pref))
+        # with instrumentation, every run prints a summary of its timings and rejections to the Macro panel
+        self.instrumentation = self.readExtDefaultBoolean(self.instrumentation)
         try:
             self.limitToCharset = int(self.limitToCharset)
         except:
             self.limitToCharset = 1
+        try:
+            self.dictCacheEntries = int(self.dictCacheEntries)
+            self.dictCacheMB = int(self.dictCacheMB)
+        except (TypeError, ValueError):
+            self.dictCacheEntries, self.dictCacheMB = 4, 256
         # parse mark color pref
         # print "***", self.reqMarkColor
         if self.reqMarkColor != "None":
@@ -256,6 +341,7 @@ class WordomatWindow:
         """Check if the UI needs toggling between text/grep mode input fields."""
         self.matchMode = "grep" if sender.get() == 1 else "text"
         self.toggleMatchModeFields()
+        self.settingsChanged()
 
     def toggleMatchModeFields(self):
         """Toggle between showing text or grep mode input fields."""
@@ -280,105 +366,115 @@ class WordomatWindow:
         return "False"
 
     def loadDictionaries(self):
-        """Load the available wordlists from the dictionaries folder structured by writing systems."""
-        self.dictWords = {}
-        self.allWords = []
-        self.outputWords = []
+        """Register the available wordlists from the dictionaries folder structured by writing systems.
 
-        import os
+        Only file names are scanned here; a wordlist is read when it is first selected or used.
+        """
+        self.outputWords = []
 
         # Define the path to the dictionaries folder relative to this file
         dictFolder = os.path.join(os.path.dirname(__file__), "dictionaries")
-
-        self.languagesByWS = {}  # Maps writing system -> list of language names
-        self.writingSystems = []  # List of writing system names
-
-        contentLimit = '*****'  # If a header exists, ignore lines before this delimiter
-
-        if os.path.exists(dictFolder):
-            # Loop over each subfolder (writing system)
-            for writingSystem in os.listdir(dictFolder):
-                wsPath = os.path.join(dictFolder, writingSystem)
-                if os.path.isdir(wsPath):
-                    # Initialize the language list for this writing system
-                    self.languagesByWS[writingSystem] = []
-                    for fileName in os.listdir(wsPath):
-                        if fileName.lower().endswith(".txt"):
-                            language = os.path.splitext(fileName)[0]
-                            self.languagesByWS[writingSystem].append(language)
-
-                            filePath = os.path.join(wsPath, fileName)
-                            try:
-                                with codecs.open(filePath, mode="r", encoding="utf-8") as fo:
-                                    lines = fo.read().splitlines()
-                            except Exception as e:
-                                Message("Error", "Could not load dictionary file:\n%s" % filePath)
-                                continue
-
-                            try:
-                                contentStart = lines.index(contentLimit) + 1
-                                lines = lines[contentStart:]
-                            except ValueError:
-                                pass
-
-                            # Store using a tuple key: (writingSystem, language)
-                            self.dictWords[(writingSystem, language)] = lines
-            self.writingSystems = sorted(list(self.languagesByWS.keys()))
-        else:
+        if not os.path.exists(dictFolder):
             Message("Error", "Dictionaries folder not found at:\n%s" % dictFolder)
 
-        # Optionally, load the user dictionary as before (if needed)
+        self.dictionaries = worddicts.DictionaryRegistry(dictFolder,
+                                                         maxEntries=self.dictCacheEntries,
+                                                         maxBytes=self.dictCacheMB * 1024 * 1024,
+                                                         cacheFolder=wordcache.defaultCacheFolder(),
+                                                         importFolder=wordcache.defaultImportFolder())
+        self.engine = wordengine.WordEngine(self.dictionaries)
+        self.preview = wordpreview.MatchPreview(self.engine)
+        self.languagesByWS = self.dictionaries.languagesByWS  # Maps writing system -> list of language names
+        self.writingSystems = self.dictionaries.writingSystems  # List of writing system names
+
+    def loadDictionary(self, query, stats=None):
+        """Return the words of the query's dictionary, loading and compiling it on first use (background thread).
+
+        Returns None on failure, after posting the error message to the main thread.
+        """
         try:
-            with open('/usr/share/dict/words', 'r') as userFile:
-                lines = userFile.read().splitlines()
-            self.dictWords[("User", "user")] = lines
-            if "User" in self.languagesByWS:
-                self.languagesByWS["User"].append("user")
-            else:
-                self.languagesByWS["User"] = ["user"]
-                self.writingSystems.append("User")
-        except Exception as e:
-            Message("Error", "Could not load user dictionary:\n%s" % str(e))
-
-    def changeSourceCallback(self, sender):
-        """On changing source/wordlist, check if a custom word list should be loaded."""
-        customIndex = len(self.textfiles) + 2
-        if sender.get() == customIndex:  # Custom word list
-            try:
-                # filePath = getFile(title="Load custom word list", messageText="Select a text file with words on separate lines", fileTypes=["txt"])[0] # open dialog from the vanilla version used in Glyphs 2 is not working in 10.15 (and above) any more. So if we drop Glyphs 2 support, this
-                filePath = GetOpenFile(message="Load custom word list. Select a text file with words on separate lines", filetypes=["txt"])
-            except TypeError:
-                filePath = None
-                self.customWords = []
-                print("word-o-mat: Input of custom word list canceled, using default")
-            if filePath is not None:
-                fo = codecs.open(filePath, mode="r", encoding="utf-8")
-                lines = fo.read()
-                fo.close()
-                # self.customWords = lines.splitlines()
-                self.customWords = []
-                for line in lines.splitlines():
-                    w = line.strip()  # strip whitespace from beginning/end
-                    self.customWords.append(w)
-
-    def fontCharacters(self, font):
-        """Check which Unicode characters are available in the font."""
+            with wordstats.timed(stats, "dictionary"):
+                return self.engine.words(query)
+        except KeyError:
+            callAfter(Message, title="Error", message="Selected dictionary not found.")
+        except (IOError, OSError, UnicodeDecodeError, ValueError):
+            callAfter(Message, title="Error", message="Could not load dictionary file:\n%s"
+                      % self.dictionaries.path(query.writingSystem, query.language))
+        return None
+
+    def importCorpus(self):
+        """Ask for a text file and import it as a dictionary of the "Custom" writing system, named after the file.
+
+        The import runs in a background thread (see wordimport) and reports its progress below the word count.
+        """
+        if self.importer is not None:
+            Message(title="word-o-mat", message="A corpus is being imported already.")
+            return
+        try:
+            # filePath = getFile(title="Import corpus", messageText="Select a UTF-8 text file", fileTypes=["txt"])[0] # see the note at the imports
+            filePath = GetOpenFile(message="Import a corpus. Select a UTF-8 text file of running text; its words become a new dictionary", filetypes=["txt"])
+        except TypeError:
+            filePath = None
+        if filePath is None:
+            print("word-o-mat: Import of corpus canceled")
+            return
+        writingSystem = wordimport.importWritingSystem
+        language = os.path.splitext(os.path.basename(filePath))[0]
+        destPath = wordimport.importPath(writingSystem, language, self.dictionaries.importFolder)
+        self.importer = wordimport.CorpusImporter(filePath, destPath)
+        self.g1.matchCount.set(self.importer.progressText())
+        Thread(target=self.importInBackground, args=(self.importer, writingSystem, language)).start()
+
+    def importInBackground(self, importer, writingSystem, language):
+        """Run a CorpusImporter, posting its progress and result to the main thread."""
+        try:
+            importer.run(lambda importer: callAfter(self.showImportProgress, importer))
+        except wordimport.ImportCancelled:
+            callAfter(self.importFinished, importer, writingSystem, language, None)
+        except (IOError, OSError, ValueError) as e:
+            callAfter(self.importFinished, importer, writingSystem, language, e)
+        else:
+            callAfter(self.importFinished, importer, writingSystem, language, None)
+
+    def showImportProgress(self, importer):
+        if importer is self.importer:
+            self.g1.matchCount.set(importer.progressText())
+
+    def importFinished(self, importer, writingSystem, language, error):
+        """Register an imported dictionary and select it (main thread)."""
+        self.importer = None
+        self.g1.matchCount.set("")
+        if error is not None:
+            Message(title="word-o-mat", message="Could not import %s:\n%s" % (importer.sourcePath, error))
+            return
+        if importer.cancelled:
+            return
+        self.dictionaries.register(writingSystem, language, importer.destPath)
+        self.preview.clear()
+        self.g1.writingSystem.setItems(self.writingSystems + [importItem])
+        self.g1.writingSystem.set(self.writingSystems.index(writingSystem))
+        self.updateLanguagePopUp(writingSystem)
+        self.g1.language.set(self.languagesByWS[writingSystem].index(language))
+        print("word-o-mat: imported %s words from %s" % ("{:,}".format(importer.words), importer.sourcePath))
+        self.settingsChanged()
+
+    def fontCharacters(self, font, stats=None):
+        """Check which Unicode characters are available in the font.
+
+        Returns a frozenset of characters and a dict mapping them to glyph names. Both are cached
+        per font, and kept up to date by the glyphChanged and fontWillClose observers.
+        """
         if not font:
-            return []
-        charset = []
-        gnames = []
-        for g in font.glyphs:
-            if g.unicode is not None:
-                try:
-                    charset.append(g.charString())
-                    gnames.append(g.name)
-                except ValueError:
-                    pass
-        return charset, gnames
+            return frozenset(), {}
+        charset = wordmetrics.fontCharset(font, stats)
+        return charset.chars, charset.glyphNames
 
     # INPUT HANDLING
-    def getInputString(self, field, stripColon):
-        """Read an input string from a field, and convert it to a list of glyphnames."""
+    def getInputString(self, field, stripColon, quiet=False, stats=None):
+        """Read an input string from a field, and convert it to a list of glyphnames.
+
+        With quiet, glyph names that can't be used are skipped without a message.
+        """
         inputString = field.get()
         pattern = re.compile(" *, *| +")
         if stripColon:
@@ -392,28 +488,44 @@ class WordomatWindow:
             if len(c) > 1:  # glyph names
                 if self.f is not None:
                     g = self.f.glyphs[c]
+                    if stats is not None:
+                        stats.bridgeCalls += 2 if g else 1
                     if g:
                         value = g.unicodeChar()
                         if value > 0:
                             result2.append(chr(value))
-                        else:  # unicode not set
+                        elif not quiet:  # unicode not set
                             Message(title="word-o-mat", message="Glyph \"%s\" was found, but does not appear to have a Unicode value set. It can therefore not be processed, and will be skipped." % c)
-                    else:
+                    elif not quiet:
                         Message(title="word-o-mat", message="Conflict: Character \"%s\" was specified as required, but not found. It will be skipped." % c)
-                else:
+                elif not quiet:
                     Message(title="word-o-mat", message="Sorry, matching by glyph name is only supported when a font is open. Character \"%s\" will be skipped." % c)
             else:  # character values
                 result2.append(c)
         result = [s for s in result2 if s]
         return result
 
-    def getIntegerValue(self, field):
-        """Get an integer value (or if not set, the placeholder) from a field."""
+    def getPairs(self):
+        """Read the pairs to cover as a list of two-character strings, or None for all kerned pairs."""
+        items = wordengine.splitList(self.g3.pairs.get())
+        if not items:
+            return None
+        skipped = [item for item in items if len(item) != 2]
+        if skipped:
+            Message(title="word-o-mat", message="Pairs are two characters each, e.g. \"Ty, rn\". Skipping: %s" % ", ".join(skipped))
+        return [item for item in items if len(item) == 2]
+
+    def getIntegerValue(self, field, quiet=False):
+        """Get an integer value (or if not set, the placeholder) from a field.
+
+        Unless quiet, a field that doesn't hold a number is reset to the placeholder.
+        """
         try:
             returnValue = int(field.get())
         except ValueError:
             returnValue = int(field.getPlaceholder())
-            field.set(returnValue)
+            if not quiet:
+                field.set(returnValue)
         return returnValue
 
     # INPUT CHECKING
@@ -484,7 +596,7 @@ class WordomatWindow:
         """Check if the regular expression entered by the user compiles."""
         if self.matchMode == "grep":
             try:
-                self.matchPatternRE = re.compile(self.matchPattern)
+                self.matchPatternRE = wordgrep.compilePattern(self.matchPattern).regex
                 return True
             except re.error:
                 self.matchPatternRE = None
@@ -513,79 +625,113 @@ class WordomatWindow:
 
     def sortWordsByWidth(self, wordlist):
         """Sort output word list by width."""
-        f = CurrentFont()
-        wordWidths = []
-
-        for word in wordlist:
-            unitCount = 0
-            for char in word:
-                try:
-                    glyphWidth = f[char].width
-                except:
-                    try:
-                        gname = self.glyphNamesForValues[char]
-                        glyphWidth = f[gname].width
-                    except:
-                        glyphWidth = 0
-                unitCount += glyphWidth
-            # add kerning
-            for i in range(len(word) - 1):
-                pair = list(word[i:i + 2])
-                unitCount += int(self.findKerning(pair))
-            wordWidths.append(unitCount)
-
-        wordWidths_sorted, wordlist_sorted = zip(*sorted(zip(wordWidths, wordlist)))  # thanks, stackoverflow
-        return wordlist_sorted
+        font = CurrentFont()
+        if font is None:
+            return wordlist
+        return wordmetrics.fontMetrics(font).sortByWidth(wordlist)
 
     def findKerning(self, chars):
-        """Helper function to find kerning between two given glyphs.
-        This assumes MetricsMachine style group names."""
-        ''' # code for RF
-        markers = ["@MMK_L_", "@MMK_R_"]
-        keys = [c for c in chars]
-
-        for i in range(2):
-            allGroups = self.f.groups.findGlyph(chars[i])
-            if len(allGroups) > 0:
-                for g in allGroups:
-                    if markers[i] in g:
-                        keys[i] = g
-                        continue
-
-        key = (keys[0], keys[1])
-        if key in self.f.kerning:
-            return self.f.kerning[key]
-        else:
-            return 0
-        '''
-        # code for Glyphs
-        glyph1 = self.f.glyphForCharacter_(ord(chars[0]))
-        glyph2 = self.f.glyphForCharacter_(ord(chars[1]))
-        # print("chars", chars, glyph1, glyph2)
-        masterId = self.f.masters[0].id
-        kerning = self.f.kerningForFontMasterID_firstGlyph_secondGlyph_direction_(masterId, glyph1, glyph2, 0)
-        if kerning < 100000:
-            return kerning
-        return 0
+        """Helper function to find kerning between two given glyphs."""
+        return wordmetrics.fontMetrics(self.f).kern(chars[0], chars[1])
+
+    # LIVE PREVIEW
+
+    def settingsChanged(self, sender=None):
+        """Schedule a preview update once the settings haven't changed for previewDelay seconds."""
+        self.previewToken += 1
+        callLater(previewDelay, self.startPreview, self.previewToken)
+
+    def startPreview(self, token):
+        """Compute the match count for the current settings in the background, unless they changed again."""
+        if token != self.previewToken or self.run is not None:
+            return
+        query = self.previewQuery()
+        if query is None:
+            self.g1.matchCount.set("")
+            return
+        self.previewExecutor.submit(self.computePreview, token, query)
+
+    def previewQuery(self):
+        """Read the current settings into a WordQuery without messages or changes to the fields; None if they can't be used."""
+        self.f = CurrentFont()
+        writingSystem = self.g1.writingSystem.getItem()
+        language = self.g1.language.getItem()
+        if (writingSystem, language) not in self.dictionaries:
+            return None
+        charset = None
+        limitToCharset = self.g1.base.get()
+        if limitToCharset and self.f is not None:
+            charset = self.fontCharacters(self.f)[0]
+            if limitToCharset == 2 and self.f.selection:
+                charset = [chr(g.unicodeChar()) for g in self.f.selection if g.unicodeChar() > 0]
+        matchPattern = self.g2.grepMode.grepBox.get()
+        if self.matchMode == "grep":
+            try:
+                wordgrep.compilePattern(matchPattern)
+            except re.error:
+                return None
+        groupBoxes = [self.g2.textMode.group1box, self.g2.textMode.group2box, self.g2.textMode.group3box]
+        return wordengine.WordQuery(writingSystem, language,
+                                    minLength=self.getIntegerValue(self.g1.minLength, quiet=True),
+                                    maxLength=self.getIntegerValue(self.g1.maxLength, quiet=True),
+                                    case=self.g1.case.get(), charset=charset,
+                                    requiredLetters=self.getInputString(self.g2.textMode.mustLettersBox, False, quiet=True),
+                                    requiredGroups=[self.getInputString(box, True, quiet=True) for box in groupBoxes],
+                                    requiredSequences=wordengine.splitList(self.g2.textMode.sequencesBox.get()),
+                                    matchMode=self.matchMode, matchPattern=matchPattern,
+                                    banRepetitions=self.g3.checkbox0.get())
+
+    def computePreview(self, token, query):
+        """Count the matching words and pick a few samples (preview thread)."""
+        if token != self.previewToken:
+            return
+        try:
+            count, samples = self.preview.update(query)
+        except (KeyError, ValueError, re.error, IOError, OSError):
+            return
+        callAfter(self.showPreview, token, count, samples)
+
+    def showPreview(self, token, count, samples):
+        """Show the match count and the sample words below the word count field (main thread)."""
+        if token != self.previewToken or self.run is not None or self.importer is not None:
+            return
+        text = self.formatMatchCount(count)
+        if samples:
+            text += ": " + ", ".join(samples)
+        self.g1.matchCount.set(text)
+
+    def formatMatchCount(self, count):
+        return "%s matching word%s" % ("{:,}".format(count), "" if count == 1 else "s")
 
     def makeWords(self, sender=None):
         """Parse user input, save new values to prefs, compile and display the resulting words.
         I think this function is too long and bloated, it should be taken apart. ########
+
+        The words are made in a background thread; while that runs, the button stops it.
         """
-        global warned
+        if self.run is not None:
+            self.run.cancel()
+            return
+        stats = wordstats.RunStats() if self.instrumentation else None
         self.f = CurrentFont()
 
         if self.f is not None:
-            self.fontChars, self.glyphNames = self.fontCharacters(self.f)
-            self.glyphNamesForValues = {self.fontChars[i]: self.glyphNames[i] for i in range(len(self.fontChars))}
+            with wordstats.timed(stats, "fontCharacters"):
+                self.fontChars, self.glyphNamesForValues = self.fontCharacters(self.f, stats)
         else:
-            self.fontChars = []
-            self.glyphNames = []
+            self.fontChars = frozenset()
+            self.glyphNamesForValues = {}
 
         self.wordCount = self.getIntegerValue(self.g1.wordCount)
         self.minLength = self.getIntegerValue(self.g1.minLength)
         self.maxLength = self.getIntegerValue(self.g1.maxLength)
         self.case = self.g1.case.get()
+        self.lineCount = self.getIntegerValue(self.g3.lineCount)
+        self.lineWidth = self.getIntegerValue(self.g3.lineWidth)
+        self.lineTolerance = self.getIntegerValue(self.g3.lineTolerance)
+        self.pairs = self.g3.pairs.get()
+        self.minWidth = self.getIntegerValue(self.g3.minWidth)
+        self.maxWidth = self.getIntegerValue(self.g3.maxWidth)
         self.customCharset = []
 
         self.limitToCharset = self.g1.base.get()
@@ -602,6 +748,8 @@ class WordomatWindow:
                         value = g.unicodeChar()
                         if value > 0:
                             self.customCharset.append(chr(value))
+                    if stats is not None:
+                        stats.bridgeCalls += 2 + 2 * len(self.customCharset)
                 except AttributeError:
                     pass
 
@@ -615,10 +763,12 @@ class WordomatWindow:
 
             self.matchMode = "text" if self.g2.matchMode.get() == 0 else "grep"  # adjust match mode accordingly
 
-        self.requiredLetters = self.getInputString(self.g2.textMode.mustLettersBox, False)
-        self.requiredGroups[0] = self.getInputString(self.g2.textMode.group1box, True)
-        self.requiredGroups[1] = self.getInputString(self.g2.textMode.group2box, True)
-        self.requiredGroups[2] = self.getInputString(self.g2.textMode.group3box, True)
+        with wordstats.timed(stats, "getInputString"):
+            self.requiredLetters = self.getInputString(self.g2.textMode.mustLettersBox, False, stats=stats)
+            self.requiredGroups[0] = self.getInputString(self.g2.textMode.group1box, True, stats=stats)
+            self.requiredGroups[1] = self.getInputString(self.g2.textMode.group2box, True, stats=stats)
+            self.requiredGroups[2] = self.getInputString(self.g2.textMode.group3box, True, stats=stats)
+        self.requiredSequences = self.g2.textMode.sequencesBox.get()
         self.matchPattern = self.g2.grepMode.grepBox.get()
 
         self.banRepetitions = self.g3.checkbox0.get()
@@ -627,9 +777,7 @@ class WordomatWindow:
         # ---- NEW DICTIONARY SELECTION USING TWO DROP-DOWN MENUS ----
         selectedWS = self.g1.writingSystem.getItem()
         selectedLanguage = self.g1.language.getItem()
-        if (selectedWS, selectedLanguage) in self.dictWords:
-            self.allWords = self.dictWords[(selectedWS, selectedLanguage)]
-        else:
+        if (selectedWS, selectedLanguage) not in self.dictionaries:
             Message(title="Error", message="Selected dictionary not found.")
             return
 
@@ -646,6 +794,13 @@ class WordomatWindow:
             "matchMode": self.matchMode,
             "matchPattern": self.matchPattern,  # non compiled string
             "markColor": markColorPref,
+            "lineCount": self.lineCount,
+            "lineWidth": self.lineWidth,
+            "lineTolerance": self.lineTolerance,
+            "pairs": self.pairs,
+            "requiredSequences": self.requiredSequences,
+            "minWidth": self.minWidth,
+            "maxWidth": self.maxWidth,
         }
         for key, value in extDefaults.items():
             setExtensionDefault("com.ninastoessinger.word-o-mat." + key, value)
@@ -654,79 +809,202 @@ class WordomatWindow:
         if self.checkInput(self.limitToCharset, self.fontChars, self.customCharset, self.requiredLetters,
                            self.minLength, self.maxLength, self.case):
 
-            checker = wordcheck.wordChecker(self.limitToCharset, self.fontChars, self.customCharset,
-                                            self.requiredLetters, self.requiredGroups, self.matchPatternRE,
-                                            self.banRepetitions, self.minLength, self.maxLength,
-                                            matchMode=self.matchMode)
-
-            for i in self.allWords:
-                if len(self.outputWords) >= self.wordCount:
-                    break
-                else:
-                    w = choice(self.allWords)
-                    if self.case == 1:
-                        w = w.lower()
-                    elif self.case == 2:
-                        try:
-                            ijs = ["ij", "IJ", "Ij"]
-                            # Note: Adjust this section if needed based on the language selected.
-                            if w[:2] in ijs:
-                                w = "IJ" + w[2:]
-                            else:
-                                w = w.title()
-                        except IndexError:
-                            w = w.title()
-                    elif self.case == 3:
-                        if u"ß" in w:
-                            w = w.replace(u"ß", "ss")
-                        w = w.upper()
-                    elif self.case == 4:
-                        w = ransom(w)
-
-                    if checker.checkWord(w, self.outputWords):
-                        self.outputWords.append(w)
-
-            # output
-            if len(self.outputWords) < 1:
-                Message(title="word-o-mat", message="no matching words found <sad trombone>")
-            else:
-                joinString = " "
-                if self.g3.listOutput.get():
-                    joinString = "\\n"
-                    self.outputWords = self.sortWordsByWidth(self.outputWords)
-                outputString = joinString.join(self.outputWords)
-                try:
-                    sp = OpenSpaceCenter(CurrentFont())
-                    sp.setRaw(outputString)
-                except:
-                    if not warned:
-                        Message(title="word-o-mat",
-                                message="No open fonts found; words will be displayed in the Output Window.")
-                    warned = True
-                    print("word-o-mat:", outputString)
+            charset = None
+            if self.limitToCharset:
+                charset = self.customCharset if len(self.customCharset) > 0 else self.fontChars
+            query = wordengine.WordQuery(selectedWS, selectedLanguage, wordCount=self.wordCount,
+                                         minLength=self.minLength, maxLength=self.maxLength, case=self.case,
+                                         charset=charset, requiredLetters=self.requiredLetters,
+                                         requiredGroups=self.requiredGroups,
+                                         requiredSequences=wordengine.splitList(self.requiredSequences),
+                                         matchMode=self.matchMode, matchPattern=self.matchPattern,
+                                         banRepetitions=self.banRepetitions)
+            listOutput = self.g3.listOutput.get()
+            allMatches = self.g3.allMatches.get()
+            fitLines = None
+            if self.g3.fitLines.get():
+                if self.f is None:
+                    Message(title="word-o-mat", message="Fitting lines needs an open font to measure the words.")
+                    return
+                fitLines = (self.lineCount, self.lineWidth, self.lineTolerance)
+            coverPairs = None
+            if self.g3.coverPairs.get():
+                if self.f is None:
+                    Message(title="word-o-mat", message="Covering pairs needs an open font for its kerning.")
+                    return
+                coverPairs = (self.getPairs(), self.g3.kerningGroups.get())
+            widthRange = None
+            if self.g3.widthRange.get():
+                if self.f is None:
+                    Message(title="word-o-mat", message="Choosing words by width needs an open font to measure them.")
+                    return
+                widthRange = (min(self.minWidth, self.maxWidth), max(self.minWidth, self.maxWidth))
+            # the font is only read here on the main thread; the background thread gets plain Python data
+            metrics = None
+            if (listOutput or fitLines or coverPairs or widthRange) and self.f is not None:
+                with wordstats.timed(stats, "fontMetrics"):
+                    metrics = wordmetrics.fontMetrics(self.f, stats=stats)
+            self.run = self.engine.stream(query, stats=stats)
+            self.w.submit.setTitle("stop")
+            self.g1.matchCount.set("")
+            Thread(target=self.generateInBackground,
+                   args=(self.run, self.wordCount, listOutput, allMatches, metrics, fitLines, coverPairs,
+                         widthRange)).start()
         else:
             print("word-o-mat: Aborted because of errors")
 
+    def generateInBackground(self, run, wordCount, listOutput, allMatches, metrics, fitLines=None, coverPairs=None,
+                             widthRange=None):
+        """Produce the words of a WordStream, posting progress, output and the match count to the main thread.
+
+        fitLines is None, or (line count, width, tolerance) to output lines of that width instead.
+        coverPairs is None, or (pairs, collapse to groups) to output words covering those pairs
+        (all kerned pairs if pairs is None). widthRange is None, or (min width, max width) to output words
+        of that width, narrowest first (see WordEngine.widthMatches). The dictionary is loaded here as well, so a large
+        wordlist compiled on first use doesn't block the interface.
+        """
+        words = []
+        stats = run.stats
+        try:
+            if self.loadDictionary(run.query, stats) is None:
+                run.cancel()  # the error is shown already
+            elif coverPairs is not None:
+                pairs, groups = coverPairs
+                with wordstats.timed(stats, "coverPairs"):
+                    words, uncovered = self.engine.coverPairs(run.query, metrics, pairs, groups)
+                if words and not run.cancelled:
+                    callAfter(self.runOutput, run, " ".join(words))
+                if uncovered:
+                    print("word-o-mat: no matching word contains these %d pairs:" % len(uncovered), " ".join(uncovered))
+            elif fitLines is not None:
+                lineCount, lineWidth, tolerance = fitLines
+                with wordstats.timed(stats, "fitLines"):
+                    lines = self.engine.fitLines(run.query, metrics, lineWidth, lineCount, tolerance)
+                words = [w for line in lines for w in line]
+                if lines and not run.cancelled:
+                    callAfter(self.runOutput, run, "\\n".join(" ".join(line) for line in lines))
+                if len(lines) < lineCount:
+                    print("word-o-mat: found words for %d of %d lines" % (len(lines), lineCount))
+            elif widthRange is not None:
+                with wordstats.timed(stats, "widthMatches"):
+                    words = self.engine.widthMatches(run.query, metrics, widthRange[0], widthRange[1])
+                if words and not run.cancelled:
+                    callAfter(self.runOutput, run, ("\n" if listOutput else " ").join(words))
+            elif allMatches:
+                # every matching word, alphabetically, straight from the dictionary indexes
+                with wordstats.timed(stats, "allMatches"):
+                    words = self.engine.allMatches(run.query)
+            else:
+                shown = 0
+                for chunk in run.chunks(outputChunkSize, wordCount):
+                    words.extend(chunk)
+                    if listOutput:
+                        callAfter(self.runProgress, run, len(words))
+                    elif len(words) >= 2 * shown:
+                        # show the words as they come; the tab is set to the whole text each time, so it is
+                        # only updated once the words have doubled, which keeps the total work linear
+                        callAfter(self.runOutput, run, " ".join(words), " ".join(words[shown:]))
+                        shown = len(words)
+                if not listOutput and shown < len(words) and not run.cancelled:
+                    callAfter(self.runOutput, run, " ".join(words), " ".join(words[shown:]))
+            if (fitLines is None and coverPairs is None and widthRange is None and (listOutput or allMatches)
+                    and not run.cancelled):
+                # sorting by width needs all words at once
+                if listOutput and metrics is not None:
+                    with wordstats.timed(stats, "sortByWidth"):
+                        words = metrics.sortByWidth(words)
+                if words:
+                    callAfter(self.runOutput, run, ("\\n" if listOutput else " ").join(words))
+            if not run.cancelled:
+                with wordstats.timed(stats, "countMatches"):
+                    total = len(words) if allMatches else self.engine.countMatches(run.query)
+                callAfter(self.runCount, run, total)
+        except Exception:
+            print(traceback.format_exc())
+        finally:
+            callAfter(self.runFinished, run, words)
+
+    def runProgress(self, run, count):
+        """Show the number of words found so far on the stop button (main thread)."""
+        if run is self.run:
+            self.w.submit.setTitle("stop (%d words)" % count)
+
+    def runCount(self, run, total):
+        """Show the exact number of matching words below the word count field (main thread)."""
+        if run is self.run:
+            self.g1.matchCount.set("of " + self.formatMatchCount(total))
+
+    def runOutput(self, run, outputString, newText=None):
+        """Show output posted by the background thread, unless the run was stopped (main thread)."""
+        if run is self.run and not run.cancelled:
+            with wordstats.timed(run.stats, "output"):
+                self.showOutput(outputString, newText)
+            if run.stats is not None:
+                run.stats.bridgeCalls += 3  # CurrentFont, OpenSpaceCenter and setRaw
+
+    def runFinished(self, run, words):
+        """Reset the button when the background thread is done (main thread)."""
+        if run is not self.run:
+            return
+        self.run = None
+        self.outputWords = words
+        self.w.submit.setTitle("make words!")
+        if run.stats is not None:
+            print("word-o-mat:", run.stats.summary())
+        if not words and not run.cancelled:
+            Message(title="word-o-mat", message="no matching words found <sad trombone>")
+
+    def showOutput(self, outputString, newText=None):
+        """Show the output in the Edit tab of the current font, or in the Output Window if no font is open.
+
+        newText is the part of outputString not shown before; only that part is printed to the Output Window.
+        """
+        global warned
+        try:
+            sp = OpenSpaceCenter(CurrentFont())
+            sp.setRaw(outputString)
+        except:
+            if not warned:
+                Message(title="word-o-mat",
+                        message="No open fonts found; words will be displayed in the Output Window.")
+            warned = True
+            print("word-o-mat:", outputString if newText is None else newText)
+
     def fontClosed(self, info):
         """Check if there are any fonts left open, otherwise disable relevant UI controls."""
+        wordmetrics.invalidateMetrics()
+        wordmetrics.invalidateCharset()
+        wordmetrics.forgetGlyphStamps()
         if len(AllFonts()) <= 1:
             self.g1.base.set(0)  # use any characters
             self.g1.base.enable(False)
 
+    def glyphChanged(self, info):
+        """Patch the cached charset for the glyphs being edited, and drop the cached metrics of the font.
+
+        This runs on every interface update, so only the selected layers are compared, and only if there
+        are at most maxWatchedGlyphs of them; the caches are touched only if one of their glyphs actually
+        changed (see wordmetrics.changedGlyphs). Kerning edits are noticed by wordmetrics.fontMetrics.
+        """
+        font = CurrentFont()
+        if font is None:
+            return
+        layers = font.selectedLayers or []
+        if len(layers) > maxWatchedGlyphs:
+            return
+        changed = wordmetrics.changedGlyphs(font, set(layer.parent for layer in layers))
+        if changed:
+            wordmetrics.updateGlyphs(font, changed)
+            wordmetrics.invalidateMetrics(font)
+
     def windowClose(self, sender):
-        """Remove observers when the extension window is closed."""
+        """Remove observers and stop a running generation when the extension window is closed."""
+        if self.run is not None:
+            self.run.cancel()
+        if self.importer is not None:
+            self.importer.cancel()
+        self.previewToken += 1
+        self.previewExecutor.shutdown(wait=False)
         removeObserver(self, "fontDidOpen")
         removeObserver(self, "fontWillClose")
-
-
-def ransom(s):
-    """Randomly convert the case in the string s so that
-    it looks like a ransom note.
-    """
-
-    def flip(c):
-        if random.random() < 0.5:
-            return c.lower()
-        else:
-            return c.upper()
-    return "".join(flip(c) for c in s)
+        removeObserver(self, "glyphChanged")
@@ -4,11 +4,12 @@
 Some missing API
 """
 
+import traceback
 import objc
 from Foundation import NSBundle, NSUserDefaults
 from vanilla import Group, TextBox, HorizontalLine
 
-from GlyphsApp import Glyphs, Message, python_method
+from GlyphsApp import Glyphs, Message, python_method, DOCUMENTOPENED, DOCUMENTCLOSED, UPDATEINTERFACE
 
 
 __all__ = ["CurrentFont", "Message", "registerExtensionDefaults", "getExtensionDefault", "setExtensionDefault", "ExtensionBundle", "addObserver", "removeObserver", "AccordionView", "OpenSpaceCenter", "AllFonts"]
@@ -47,12 +48,34 @@ def getResourceFilePath(self, filename):
 NSBundle.getResourceFilePath = python_method(getResourceFilePath)
 
 
-def addObserver(a, b, c):
-	pass
+# RoboFont style event names -> Glyphs callback hooks
+observerEvents = {
+	"fontDidOpen": DOCUMENTOPENED,
+	"fontWillClose": DOCUMENTCLOSED,
+	"glyphChanged": UPDATEINTERFACE,
+}
+_observers = {}
 
 
-def removeObserver(a, b):
-	pass
+def addObserver(observer, method, event):
+	"""Call method (a method name of observer, or a function) with the notification when event happens."""
+	removeObserver(observer, event)
+	if not callable(method):
+		method = getattr(observer, method)
+
+	def callback(notification):
+		try:
+			method(notification)
+		except Exception:
+			print(traceback.format_exc())
+	Glyphs.addCallback(callback, observerEvents[event])
+	_observers[(id(observer), event)] = callback
+
+
+def removeObserver(observer, event):
+	callback = _observers.pop((id(observer), event), None)
+	if callback is not None:
+		Glyphs.removeCallback(callback)
 
 
 class AccordionView(Group):
@@ -0,0 +1,197 @@
+# coding=utf-8
+"""
+Parallel batch generation for word-o-mat.
+
+A batch is a list of jobs, each one query spec for one dictionary and
+(optionally) one font charset, e.g. the same settings for every language of
+a writing system and every font of a family. Jobs are grouped by dictionary
+and run on a pool of worker processes. The wordlists are never sent to the
+workers with their tasks: with the "fork" start method the workers inherit
+the dictionaries and indexes the parent has already loaded, otherwise they
+memory-map the compiled wordlists from the shared cache folder themselves.
+
+Every job draws its words from its own random generator, seeded from the
+batch seed and the job key, so a batch gives the same words for the same
+seed whatever the number of workers.
+"""
+import multiprocessing
+import os
+
+import worddicts
+import wordengine
+import wordsample
+
+
+class BatchJob(object):
+    """One query of a batch.
+
+    Attributes:
+    key (str):      Unique key of the job; also seeds its random generator.
+    spec (dict):    Query spec as accepted by WordQuery.fromDict.
+    info (dict):    Fields copied to the result, e.g. the query id, dictionary and font name.
+    """
+
+    def __init__(self, key, spec, info=None):
+        self.key = key
+        self.spec = spec
+        self.info = info or {}
+
+
+def dictionaryOf(spec):
+    """Return the "Writing system/language" a spec asks for, or None (also if it isn't a string)."""
+    if "dictionary" in spec:
+        dictionary = spec["dictionary"]
+        return dictionary if isinstance(dictionary, str) else None
+    if "writingSystem" in spec and "language" in spec:
+        return "%s/%s" % (spec["writingSystem"], spec["language"])
+    return None
+
+
+def expandJobs(specs, dictionaries, charsets=None, allLanguages=False):
+    """Turn query specs into jobs: one per spec, language and font charset.
+
+    With allLanguages, every spec runs for all languages of its writing system.
+    charsets maps font name -> characters; if it is None, the specs keep their own charset.
+    Specs are not validated here; broken ones give an error result when they run.
+    """
+    jobs = []
+    for number, spec in enumerate(specs):
+        spec = dict(spec)
+        queryID = spec.pop("id", number)
+        dictionary = dictionaryOf(spec)
+        dictionaryNames = [dictionary]
+        if allLanguages and dictionary is not None:
+            writingSystem = dictionary.split("/", 1)[0]
+            dictionaryNames = ["%s/%s" % (writingSystem, language)
+                               for language in dictionaries.languagesByWS.get(writingSystem, [])] or [dictionary]
+        for dictionary in dictionaryNames:
+            if dictionary is not None:
+                for key in ("writingSystem", "language"):
+                    spec.pop(key, None)
+                spec["dictionary"] = dictionary
+            fonts = sorted(charsets.items()) if charsets is not None else [(None, spec.get("charset"))]
+            for fontName, charset in fonts:
+                jobSpec = dict(spec)
+                info = {"id": queryID, "dictionary": dictionary}
+                if fontName is not None:
+                    jobSpec["charset"] = charset
+                    info["font"] = fontName
+                key = "%s/%s/%s" % (queryID, dictionary, fontName)
+                jobs.append(BatchJob(key, jobSpec, info))
+    return jobs
+
+
+def runJob(engine, job, seed):
+    """Run one job and return its result dict, with either "words" or "error".
+
+    Jobs without a seed of their own get one derived from the batch seed and the job key.
+    A "page" in the spec asks for that page of the seeded result (see WordEngine.page),
+    "all": true for all matching words, and "total": true adds the number of matching words.
+    """
+    result = dict(job.info)
+    try:
+        spec = dict(job.spec)
+        pageNumber = spec.pop("page", None)
+        allWords = spec.pop("all", False)
+        total = spec.pop("total", False)
+        query = wordengine.WordQuery.fromDict(spec)
+        if query.seed is None:
+            query.seed = wordsample.deriveSeed(seed, job.key)
+        if total:
+            result["total"] = engine.countMatches(query)
+        if allWords:
+            result["words"] = engine.allMatches(query)
+        elif pageNumber is not None:
+            result["page"] = int(pageNumber)
+            result["words"] = engine.page(query, int(pageNumber))
+        else:
+            result["words"] = engine.generate(query)
+    except Exception as e:  # a broken spec (e.g. a list where a number belongs) only fails its own job
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+    return result
+
+
+def chunkJobs(jobs, chunkSize):
+    """Split jobs into chunks of (index, job) that each use only one dictionary."""
+    byDictionary = {}
+    for i, job in enumerate(jobs):
+        byDictionary.setdefault(dictionaryOf(job.spec), []).append((i, job))
+    chunks = []
+    for group in byDictionary.values():
+        for start in range(0, len(group), chunkSize):
+            chunks.append(group[start:start + chunkSize])
+    return chunks
+
+
+def preload(engine, jobs, indexes=False):
+    """Load the wordlists (and with indexes, the character indexes) the jobs will use."""
+    registry = engine.dictionaries
+    for job in jobs:
+        dictionary = dictionaryOf(job.spec)
+        if dictionary is None or "/" not in dictionary:
+            continue
+        writingSystem, language = dictionary.split("/", 1)
+        if (writingSystem, language) not in registry:
+            continue
+        try:
+            registry.get(writingSystem, language)
+            if indexes and job.spec.get("matchMode", "text") == "text":
+                engine.charIndex(writingSystem, language)
+        except (IOError, OSError, ValueError) as e:
+            print("word-o-mat: could not preload %s (%s)" % (dictionary, e))
+
+
+_engine = None  # the engine of a worker process
+_seed = None
+
+
+def _initWorker(dictFolder, entries, cacheFolder, seed):
+    """Set up a worker process; workers forked from the batch process already have the engine."""
+    global _engine, _seed
+    _seed = seed
+    if _engine is None:
+        registry = worddicts.DictionaryRegistry(dictFolder, maxEntries=0, userDict=None, cacheFolder=cacheFolder)
+        for writingSystem, language, path in entries:
+            registry.register(writingSystem, language, path)
+        _engine = wordengine.WordEngine(registry)
+
+
+def _runChunk(chunk):
+    return [(i, runJob(_engine, job, _seed)) for i, job in chunk]
+
+
+def runJobs(engine, jobs, seed, workers=1, chunkSize=8):
+    """Yield the result of every job, in the order of jobs.
+
+    workers is the number of processes (0 = one per CPU); with 1, the jobs run in this process.
+    """
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+    if workers <= 1:
+        for job in jobs:
+            yield runJob(engine, job, seed)
+        return
+
+    global _engine
+    context = multiprocessing.get_context()
+    forked = context.get_start_method() == "fork"
+    # with fork, dictionaries and indexes loaded now are shared with all workers;
+    # otherwise this at least makes sure the compiled wordlists exist before the workers map them
+    preload(engine, jobs, indexes=forked)
+    registry = engine.dictionaries
+    _engine = engine if forked else None
+    results = {}
+    nextIndex = 0
+    try:
+        pool = context.Pool(workers, _initWorker, (registry.dictFolder, registry.entries(), registry.cacheFolder, seed))
+        try:
+            for chunkResults in pool.imap_unordered(_runChunk, chunkJobs(jobs, chunkSize)):
+                results.update(chunkResults)
+                while nextIndex in results:
+                    yield results.pop(nextIndex)
+                    nextIndex += 1
+        finally:
+            pool.terminate()
+    finally:
+        _engine = None
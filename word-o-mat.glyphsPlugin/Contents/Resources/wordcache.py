@@ -0,0 +1,267 @@
+# coding=utf-8
+"""
+Precompiled binary wordlists for word-o-mat.
+
+A wordlist .txt is compiled once into a compact file holding an offsets table
+and one contiguous UTF-8 blob (the header before ***** is stripped). Loading
+memory-maps that file; words are only decoded when they are accessed.
+Words are stored sorted by length, with a table of the ID range of every length.
+A compiled file remembers the size and mtime of its source and is rebuilt
+automatically when those change.
+
+Structures derived from a compiled wordlist, such as its character index,
+can be stored next to it as well (see cachedStructure).
+
+Run this module to compile all bundled dictionaries in advance:
+    python wordcache.py [dictionaries folder] [cache folder]
+"""
+from __future__ import print_function
+
+import hashlib
+import mmap
+import os
+import pickle
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from collections.abc import Sequence
+
+import worddicts
+
+MAGIC = b"WOMW"
+VERSION = 2
+# magic, version, byte order, source size, source mtime (ns), word count, blob size, length table size
+headerFormat = "<4sHHQqQQI"
+headerSize = struct.calcsize(headerFormat)
+byteOrderMark = 1 if sys.byteorder == "little" else 2
+
+
+def defaultCacheFolder():
+    """Return the folder used for compiled wordlists."""
+    folder = os.environ.get("WORDOMAT_CACHE")
+    if folder:
+        return folder
+    if sys.platform == "darwin":
+        return os.path.expanduser("~/Library/Caches/com.ninastoessinger.word-o-mat")
+    return os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "word-o-mat")
+
+
+def defaultImportFolder():
+    """Return the folder for imported wordlists (see wordimport), one subfolder per writing system."""
+    folder = os.environ.get("WORDOMAT_IMPORTS")
+    if folder:
+        return folder
+    if sys.platform == "darwin":
+        return os.path.expanduser("~/Library/Application Support/com.ninastoessinger.word-o-mat/dictionaries")
+    return os.path.join(os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share")), "word-o-mat",
+                        "dictionaries")
+
+
+def cachePath(sourcePath, cacheFolder):
+    """Return the path of the compiled file for a given wordlist source."""
+    sourcePath = os.path.abspath(sourcePath)
+    digest = hashlib.sha1(sourcePath.encode("utf-8")).hexdigest()[:12]
+    name = os.path.splitext(os.path.basename(sourcePath))[0]
+    return os.path.join(cacheFolder, "%s-%s.wordlist" % (name, digest))
+
+
+def sourceStamp(sourcePath):
+    """Return the (size, mtime in ns) pair used to detect changes of a source file."""
+    st = os.stat(sourcePath)
+    return st.st_size, st.st_mtime_ns
+
+
+def writeCompiled(words, destPath, stamp=(0, 0)):
+    """Write a list of words to destPath in the compiled format."""
+    writeCompiledStream(sorted(words, key=len), destPath, stamp)
+
+
+def writeCompiledStream(words, destPath, stamp=(0, 0), bufferSize=65536):
+    """Write words that are already sorted by length to destPath in the compiled format.
+
+    words can be any iterable, e.g. a generator over a file far too large to hold in memory:
+    the offsets and the UTF-8 blob are spooled to temporary files, as the header needs the
+    word count first. The result is written next to its destination and then moved into place,
+    so lists that are currently mapped stay valid.
+    """
+    folder = os.path.dirname(destPath)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder)
+    lengthOffsets = array("I", [0])
+    offsets = array("I", [0])
+    count = 0
+    position = 0
+    with tempfile.TemporaryFile(dir=folder or None) as offsetsFile, \
+            tempfile.TemporaryFile(dir=folder or None) as blobFile:
+        for w in words:
+            if len(w) < len(lengthOffsets) - 1:
+                raise ValueError("Words are not sorted by length: %s" % w)
+            while len(lengthOffsets) <= len(w):
+                lengthOffsets.append(count)
+            data = w.encode("utf-8")
+            blobFile.write(data)
+            position += len(data)
+            count += 1
+            offsets.append(position)
+            if len(offsets) >= bufferSize:
+                offsets.tofile(offsetsFile)
+                del offsets[:]
+        offsets.tofile(offsetsFile)
+        lengthOffsets.append(count)
+        if position >= 2 ** 32:
+            raise ValueError("Wordlist too large to compile: %s" % destPath)
+        header = struct.pack(headerFormat, MAGIC, VERSION, byteOrderMark, stamp[0], stamp[1], count, position,
+                             len(lengthOffsets))
+        fd, tempPath = tempfile.mkstemp(dir=folder or None, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fo:
+                fo.write(header)
+                offsetsFile.seek(0)
+                shutil.copyfileobj(offsetsFile, fo)
+                lengthOffsets.tofile(fo)
+                blobFile.seek(0)
+                shutil.copyfileobj(blobFile, fo)
+            os.replace(tempPath, destPath)
+        except:
+            if os.path.exists(tempPath):
+                os.remove(tempPath)
+            raise
+
+
+def compileWordlist(sourcePath, destPath):
+    """Compile a wordlist .txt file, stripping its header."""
+    stamp = sourceStamp(sourcePath)
+    writeCompiled(worddicts.readWordlist(sourcePath), destPath, stamp)
+
+
+def readHeader(path):
+    """Return the unpacked header of a compiled file, or None if it is missing or not valid."""
+    try:
+        with open(path, "rb") as fo:
+            data = fo.read(headerSize)
+    except (IOError, OSError):
+        return None
+    if len(data) < headerSize:
+        return None
+    header = struct.unpack(headerFormat, data)
+    if header[0] != MAGIC or header[1] != VERSION or header[2] != byteOrderMark:
+        return None
+    return header
+
+
+def isCurrent(sourcePath, destPath):
+    """Check that a compiled file exists and matches the size and mtime of its source."""
+    header = readHeader(destPath)
+    if header is None:
+        return False
+    return (header[3], header[4]) == sourceStamp(sourcePath)
+
+
+class MappedWordList(Sequence):
+    """Read-only sequence of words backed by a memory-mapped compiled file.
+
+    Attributes:
+    path (str):             Path of the compiled file.
+    nbytes (int):           Size of the mapped file.
+    lengthOffsets (view):   ID of the first word of every length (see worddicts.lengthOffsetsFor).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as fo:
+            self._map = mmap.mmap(fo.fileno(), 0, access=mmap.ACCESS_READ)
+        header = struct.unpack(headerFormat, self._map[:headerSize])
+        if header[0] != MAGIC or header[1] != VERSION or header[2] != byteOrderMark:
+            raise ValueError("Not a compiled wordlist: %s" % path)
+        self._count = header[5]
+        self.nbytes = len(self._map)
+        view = memoryview(self._map)
+        offsetsEnd = headerSize + 4 * (self._count + 1)
+        lengthsEnd = offsetsEnd + 4 * header[7]
+        self._offsets = view[headerSize:offsetsEnd].cast("I")
+        self.lengthOffsets = view[offsetsEnd:lengthsEnd].cast("I")
+        self._blob = view[lengthsEnd:lengthsEnd + header[6]]
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("word index out of range")
+        return str(self._blob[self._offsets[index]:self._offsets[index + 1]], "utf-8")
+
+    def __iter__(self):
+        blob, offsets = self._blob, self._offsets
+        for i in range(self._count):
+            yield str(blob[offsets[i]:offsets[i + 1]], "utf-8")
+
+
+def cachedStructure(name, build):
+    """Wrap a build function for DictionaryRegistry.derived so its result is also stored on disk.
+
+    For memory-mapped wordlists, build(words) is pickled to a file next to the compiled wordlist,
+    together with the stamp of that file, and loaded from there as long as the wordlist doesn't change.
+    Other wordlists are simply passed to build.
+    """
+
+    def buildCached(words):
+        path = getattr(words, "path", None)
+        if path is None:
+            return build(words)
+        structurePath = "%s.%s" % (path, name)
+        stamp = sourceStamp(path)
+        try:
+            with open(structurePath, "rb") as fo:
+                storedStamp, structure = pickle.load(fo)
+            if storedStamp == stamp:
+                return structure
+        except (IOError, OSError, EOFError, ValueError, pickle.UnpicklingError, AttributeError, ImportError):
+            pass
+        structure = build(words)
+        fd, tempPath = tempfile.mkstemp(dir=os.path.dirname(structurePath), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fo:
+                pickle.dump((stamp, structure), fo, pickle.HIGHEST_PROTOCOL)
+            os.replace(tempPath, structurePath)
+        except (IOError, OSError) as e:
+            if os.path.exists(tempPath):
+                os.remove(tempPath)
+            print("word-o-mat: could not store %s (%s)" % (structurePath, e))
+        return structure
+    return buildCached
+
+
+def loadWordlist(sourcePath, cacheFolder=None):
+    """Return a memory-mapped wordlist for sourcePath, compiling it first if the cache is missing or stale."""
+    if cacheFolder is None:
+        cacheFolder = defaultCacheFolder()
+    destPath = cachePath(sourcePath, cacheFolder)
+    if not isCurrent(sourcePath, destPath):
+        compileWordlist(sourcePath, destPath)
+    return MappedWordList(destPath)
+
+
+def compileAll(dictFolder, cacheFolder=None):
+    """Compile every wordlist below dictFolder whose compiled file is missing or stale."""
+    if cacheFolder is None:
+        cacheFolder = defaultCacheFolder()
+    registry = worddicts.DictionaryRegistry(dictFolder, userDict=None)
+    for writingSystem in registry.writingSystems:
+        for language in registry.languagesByWS[writingSystem]:
+            sourcePath = registry.path(writingSystem, language)
+            destPath = cachePath(sourcePath, cacheFolder)
+            if isCurrent(sourcePath, destPath):
+                continue
+            compileWordlist(sourcePath, destPath)
+            print("word-o-mat: compiled %s/%s" % (writingSystem, language))
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "dictionaries")
+    compileAll(folder, sys.argv[2] if len(sys.argv) > 2 else None)
@@ -1,3 +1,7 @@
+import time
+
+import wordgrep
+
 
 class wordChecker(object):
     """Checks lists of words against a number of specified requirements.
@@ -8,129 +12,205 @@ class wordChecker(object):
     customCharset (list):   If applicable, a list of permissible characters words can use.
     requiredLetters (list): Letters required in each word (text mode).
     requiredGroups (list of lists): Groups from each of which 1 member is required (text mode).
+    requiredSequences (list): Character sequences required in each word (text mode).
     matchPattern (RE):      Compiled regular expression to be matched (grep mode).
     banRepetitions (Bool):  Signals whether repeating letters are banned.
     minLength (int):        Minimal word length (inclusive).
     maxLength (int):        Maximal word length (inclusive).
     matchMode (string):     Match mode to be used ("text" or "grep").
+    checkLength (Bool):     Signals whether the word length needs checking (False if the words were preselected by length).
+    adaptive (Bool):        Signals whether the predicates are reordered by their observed cost and rejection rate (see reorder).
 
     ##### Note for future development: ideally only *either* matchPattern or required* should be required depending on the matchMode chosen; it makes no sense to pass the other stuff into this function too.
     """
 
-    def __init__(self, limitToCharset, fontChars, customCharset, requiredLetters, requiredGroups, matchPattern, banRepetitions, minLength, maxLength, matchMode="text"):
+    reorderInterval = 1024  # words checked between two profiles; doubled every time the order holds
+    maxReorderInterval = 65536
+    profileSize = 32  # words kept for every profile; they go through all predicates again, timed in bulk
+
+    def __init__(self, limitToCharset, fontChars, customCharset, requiredLetters, requiredGroups, matchPattern, banRepetitions, minLength, maxLength, matchMode="text", checkLength=True, adaptive=False, requiredSequences=()):
         self.limitToCharset = limitToCharset
         self.fontChars = fontChars
         self.customCharset = customCharset
         self.bannedLetters = [" "]  # spaces are banned inside words
 
         self.matchMode = matchMode
+        self.requiredLetters = []
+        self.requiredGroups = []
+        self.requiredSequences = []
+        self.matchPatternRE = None
         if self.matchMode == "text":
             self.requiredLetters = requiredLetters
             self.requiredGroups = requiredGroups
+            self.requiredSequences = requiredSequences
         else:  # grep
             self.matchPatternRE = matchPattern
         self.banRepetitions = banRepetitions
         self.minLength = minLength
         self.maxLength = maxLength
+        self.checkLength = checkLength
+        self.adaptive = adaptive
+        self.compile()
+
+    def compile(self):
+        """Turn the checker configuration into a list of specialized predicates.
+
+        Each predicate is a function taking a word and returning False if the word is rejected.
+        Charsets and required letters become frozensets; cheap rejections come first, until
+        an adaptive checker has measured better.
+        """
+        predicates = []
+
+        if self.checkLength:
+            minLength, maxLength = self.minLength, self.maxLength
+            predicates.append(("length", lambda word: minLength <= len(word) <= maxLength))
+
+        bannedLetters = tuple(self.bannedLetters)
+        if len(bannedLetters) == 1:
+            banned = bannedLetters[0]
+            predicates.append(("banned", lambda word: banned not in word))
+        elif bannedLetters:
+            bannedSet = frozenset(bannedLetters)
+            predicates.append(("banned", bannedSet.isdisjoint))
+
+        if self.limitToCharset:
+            useList = self.customCharset if len(self.customCharset) > 0 else self.fontChars
+            charset = frozenset(useList)
+            predicates.append(("charset", charset.issuperset))
+
+        if self.banRepetitions:
+            predicates.append(("repetition", lambda word: len(set(word)) == len(word)))
 
-    def _excludedAll(self, word, charList):
-        """Check that no banned letter occurs in a given word.
-
-        Can this be retired?"""
-        for c in charList:
-            if c in word:
-                return False
-        return True
-
-    def _includedAll(self, word, charList):
-        """Check that all required letters occur in a given word."""
-        for c in charList:
-            if c not in word:
-                return False
-        return True
-
-    def _includedAny(self, word, charList):
-        """Check that at least one letter in a group occurs in a given word."""
-        if len(charList):
-            for c in charList:
-                if c in word:
-                    return True
-            return False
-        else:
-            return True
-
-    def _includedGroups(self, word, charListList):
-        """Check that all groups have at least one member present in a given word."""
-        for charList in charListList:
-            if not self._includedAny(word, charList):
-                return False
-        return True
-
-    def _limitedTo(self, word, charList, selectedCharList, condition):
-        """Check that a given word only uses the allowed scope of letters."""
-        if len(selectedCharList) > 0:
-            useList = selectedCharList
-        else:
-            useList = charList
-        if condition:
-            for c in word:
-                if c not in useList:
-                    return False
-            return True
-        else:
-            return True
-
-    def _uniqueChars(self, word, condition):
-        """Check that a given word does not feature repeating characters."""
-        if condition:
-            wordChars = []
-            for c in word:
-                if c in wordChars:
+        if self.matchMode == "text":
+            required = frozenset(self.requiredLetters)
+            if required:
+                predicates.append(("required", required.issubset))
+            groups = [frozenset(g) for g in self.requiredGroups if len(g)]
+            if groups:
+                groups = tuple(sorted(groups, key=len))  # small groups are the most likely to reject
+                predicates.append(("groups", lambda word: not any(g.isdisjoint(word) for g in groups)))
+            sequences = tuple(s for s in self.requiredSequences if s)
+            if sequences:
+                predicates.append(("sequences", lambda word: all(s in word for s in sequences)))
+        elif self.matchPatternRE is not None:
+            predicates.append(("regex", wordgrep.grepPattern(self.matchPatternRE).matches))
+
+        self.profile = dict((name, [0, 0, 0.0]) for name, func in predicates)  # name -> [calls, rejections, seconds]
+        self._untilProfile = 0  # words to check before the next profile is taken
+        self._interval = self.reorderInterval
+        self._profileWords = []
+        self.setOrder(predicates)
+
+    def setOrder(self, predicates):
+        """Use the (name, function) predicates in the given order."""
+        self.predicates = predicates
+        checks = tuple(func for name, func in predicates)
+
+        def predicate(word):
+            for check in checks:
+                if not check(word):
                     return False
-                wordChars.append(c)
-            return True
-        else:
             return True
+        self.predicate = predicate
 
-    def _checkLength(self, word):
-        """Check that the length of a given word is within the allowed range."""
-        return self.minLength <= len(word) <= self.maxLength
-
-    def _checkExisting(self, word, outputList):
-        """Check that a given word has not already been found and listed for output."""
-        return word not in outputList
-
-    def _matchRE(self, word):
-        """Check that a given word matches the supplied regular expression."""
-        if self.matchPatternRE is not None:
-            result = self.matchPatternRE.search(word)
-        if result is None:
+    def checkWord(self, word, outputWords):
+        """Evaluate if a given word meets all the requirements specified by the user.
+
+        outputWords holds the words found so far; pass a set to keep the duplicate check O(1).
+        """
+        if self.adaptive:
+            self._untilProfile -= 1
+            if self._untilProfile < 0:
+                self._collect(word)
+        if word in outputWords:
             return False
-        return True
+        return self.predicate(word)
+
+    def rejection(self, word, outputWords):
+        """Return the name of the first check a word fails ("duplicate" or a predicate name), or None if it passes.
+
+        This is checkWord for instrumented runs (see wordstats), which count the rejections per predicate.
+        """
+        if self.adaptive:
+            self._untilProfile -= 1
+            if self._untilProfile < 0:
+                self._collect(word)
+        if word in outputWords:
+            return "duplicate"
+        for name, check in self.predicates:
+            if not check(word):
+                return name
+        return None
+
+    def _collect(self, word):
+        """Keep a word for the next profile; once there are profileSize words, profile and reorder.
+
+        While the order holds, profiles are taken less and less often.
+        """
+        self._profileWords.append(word)
+        if len(self._profileWords) >= self.profileSize:
+            self.profilePredicates(self._profileWords)
+            if self.reorder():
+                self._interval = self.reorderInterval
+            else:
+                self._interval = min(2 * self._interval, self.maxReorderInterval)
+            self._profileWords = []
+            self._untilProfile = self._interval
+
+    def profilePredicates(self, words, repeat=2):
+        """Run every predicate over words, adding their time and rejections to the profile.
+
+        Each predicate is timed over all words at once, so the timer itself hardly counts, and
+        the fastest of repeat runs is used, so a garbage collection doesn't make it look slow.
+        """
+        clock = time.perf_counter
+        for name, check in self.predicates:
+            seconds = None
+            for i in range(repeat):
+                start = clock()
+                rejections = 0
+                for word in words:
+                    if not check(word):
+                        rejections += 1
+                elapsed = clock() - start
+                if seconds is None or elapsed < seconds:
+                    seconds = elapsed
+            entry = self.profile[name]
+            entry[0] += len(words)
+            entry[1] += rejections
+            entry[2] += seconds
+
+    def expectedCost(self, predicates):
+        """Return the expected time to check a word with the predicates in the given order, from the profile."""
+        cost = 0.0
+        passing = 1.0  # share of the words that get to the next predicate
+        for name, func in predicates:
+            calls, rejections, seconds = self.profile[name]
+            if calls:
+                cost += passing * seconds / calls
+                passing *= 1.0 - (rejections + 1.0) / (calls + 2.0)  # smoothed, so no rate is ever 0 or 1
+        return cost
+
+    def reorder(self, margin=0.1):
+        """Put the predicates in the order of least expected cost, from the profile gathered so far.
+
+        For independent predicates, checking them by increasing cost per call divided by rejection
+        rate minimizes the expected cost of a word. The order only changes if it is expected to be
+        faster by more than margin, as the timings are noisy. Returns True if the order changed.
+        """
+        profile = self.profile
+
+        def rank(item):
+            calls, rejections, seconds = profile[item[0]]
+            if not calls:
+                return 0.0
+            return (seconds / calls) / ((rejections + 1.0) / (calls + 2.0))
+        predicates = sorted(self.predicates, key=rank)
+        if self.expectedCost(predicates) < (1.0 - margin) * self.expectedCost(self.predicates):
+            self.setOrder(predicates)
+            return True
+        return False
 
-    def checkWord(self, word, outputWords):
-        """Evaluate if a given word meets all the requirements specified by the user."""
-
-        # Compile the applicable requirements
-        requirements = [
-            (self._checkExisting, [outputWords]),
-            (self._limitedTo, [self.fontChars, self.customCharset, self.limitToCharset]),
-            (self._checkLength, []),
-            (self._excludedAll, [self.bannedLetters]),
-            (self._uniqueChars, [self.banRepetitions]),
-        ]
-        if self.matchMode == "text":
-            requirements.extend([
-                (self._includedAll, [self.requiredLetters]),
-                (self._includedGroups, [self.requiredGroups]),
-            ])
-        else:  # grep
-            requirements.extend([
-                (self._matchRE, []),
-            ])
-
-        # Run the word through all the requirements and see if it fails
-        for reqFunc, args in requirements:
-            if not reqFunc(word, *args):
-                return False
-        return True
+    def order(self):
+        """Return the names of the predicates in the order they are checked, for debugging."""
+        return [name for name, func in self.predicates]
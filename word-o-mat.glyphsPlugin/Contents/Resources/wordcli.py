@@ -0,0 +1,207 @@
+# coding=utf-8
+"""
+Command line interface for word-o-mat.
+
+Runs word generation without Glyphs, either for a single query given as
+options, or for a batch of query specs read from a JSON, JSON lines or CSV
+file. Batches can be expanded to all languages of a writing system and to the
+charsets of several fonts, and run on several processes (see wordbatch).
+
+Examples:
+    python wordcli.py --dictionary Latin/English --count 10 --require a --charset abcdefghijklmnop
+    python wordcli.py --batch queries.json --output results.jsonl
+    python wordcli.py --batch queries.csv --all-languages --charsets family.json --jobs 0 --seed 1
+    python wordcli.py --list
+
+Batch specs use the field names of wordengine.WordQuery ("dictionary" may
+replace writingSystem/language). In CSV files, list fields are written like
+in the plugin window ("a, b"), and requiredGroups separates groups with "|".
+A charsets file is a JSON object mapping font names to their characters.
+"""
+from __future__ import print_function
+
+import argparse
+import csv
+import io
+import json
+import re
+import random
+import sys
+
+import wordbatch
+import wordengine
+import wordstats
+
+
+def specFromRow(row):
+    """Convert a CSV row (all values are strings) into a query spec; empty cells are left out."""
+    spec = {}
+    for key, value in row.items():
+        if key is None or value is None or value == "":
+            continue
+        key = key.strip()
+        if key == "banRepetitions":
+            value = value.strip().lower() in ("1", "true", "yes")
+        spec[key] = value
+    return spec
+
+
+def readSpecs(path):
+    """Read query specs from a JSON (a list, or {"queries": [...]}), JSON lines or CSV file; "-" reads stdin."""
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with io.open(path, encoding="utf-8") as fo:
+            text = fo.read()
+    if path.lower().endswith(".csv"):
+        return [specFromRow(row) for row in csv.DictReader(io.StringIO(text))]
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        return json.loads(text)
+    if stripped.startswith("{"):
+        try:
+            data = json.loads(text)
+        except ValueError:  # JSON lines
+            return [json.loads(line) for line in text.splitlines() if line.strip()]
+        return data["queries"] if "queries" in data else [data]
+    raise ValueError("Could not read query specs from %s" % path)
+
+
+def readCharsets(path):
+    """Read a JSON object mapping font names to the characters of the font."""
+    with io.open(path, encoding="utf-8") as fo:
+        charsets = json.load(fo)
+    if not isinstance(charsets, dict):
+        raise ValueError("%s should map font names to characters" % path)
+    return {fontName: "".join(chars) for fontName, chars in charsets.items()}
+
+
+def runBatch(engine, specs, output, defaults=None, seed=None, workers=1, charsets=None, allLanguages=False):
+    """Run a list of query specs and write one JSON line per job to output. Returns the number of failed jobs."""
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    querySpecs = []
+    for number, spec in enumerate(specs):
+        querySpec = dict(defaults or {})
+        querySpec["id"] = number
+        querySpec.update(spec)
+        querySpecs.append(querySpec)
+    jobs = wordbatch.expandJobs(querySpecs, engine.dictionaries, charsets, allLanguages)
+    failed = 0
+    for result in wordbatch.runJobs(engine, jobs, seed, workers):
+        if "error" in result:
+            failed += 1
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+    return failed
+
+
+def writeStream(stream, output, count, chunkSize=1000):
+    """Write up to count words of a WordStream to output as they are produced, separated by spaces."""
+    separator = ""
+    for chunk in stream.chunks(chunkSize, count):
+        output.write(separator + " ".join(chunk))
+        output.flush()
+        separator = " "
+    output.write("\n")
+
+
+def buildParser():
+    parser = argparse.ArgumentParser(prog="wordcli", description="Generate test words with word-o-mat, without Glyphs.")
+    parser.add_argument("--dictionaries", default=wordengine.defaultDictFolder, help="dictionaries folder")
+    parser.add_argument("--cache", default=None, help="folder for compiled wordlists")
+    parser.add_argument("--list", action="store_true", help="list the available dictionaries and exit")
+    parser.add_argument("--batch", help="JSON, JSON lines or CSV file with query specs ('-' for stdin)")
+    parser.add_argument("--output", help="write results to this file instead of stdout")
+    parser.add_argument("--dictionary", help="dictionary as 'Writing system/language', e.g. Latin/English")
+    parser.add_argument("--count", type=int, dest="wordCount", help="number of words")
+    parser.add_argument("--min", type=int, dest="minLength", help="minimal word length")
+    parser.add_argument("--max", type=int, dest="maxLength", help="maximal word length")
+    parser.add_argument("--case", choices=wordengine.caseModes, help="case mode")
+    parser.add_argument("--charset", help="only use these characters")
+    parser.add_argument("--require", dest="requiredLetters", help="letters required in each word, e.g. 'a, b'")
+    parser.add_argument("--group", action="append", dest="requiredGroups", help="one of these letters is required (repeatable)")
+    parser.add_argument("--sequences", dest="requiredSequences", help="character sequences required in each word, e.g. 'Ty, ffi'")
+    parser.add_argument("--grep", dest="matchPattern", help="regular expression to match (switches to grep mode)")
+    parser.add_argument("--no-repeats", action="store_true", dest="banRepetitions", help="no repeating characters per word")
+    parser.add_argument("--all-languages", action="store_true", help="run each batch query for all languages of its writing system")
+    parser.add_argument("--charsets", help="JSON file mapping font names to characters; each batch query runs once per font")
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes for batches (0 = one per CPU)")
+    parser.add_argument("--seed", type=int, help="random seed; the same seed gives the same words")
+    parser.add_argument("--total", action="store_true", help="print the exact number of matching words")
+    parser.add_argument("--all", action="store_true", help="output all matching words, one per line")
+    parser.add_argument("--sort", choices=["alphabetical", "length"], default="alphabetical", help="order of --all output")
+    parser.add_argument("--repeat", action="store_true", help="start over when all matching words were used, for any --count")
+    parser.add_argument("--page", type=int, help="page of the seeded result to output (needs --seed; counts from 0)")
+    parser.add_argument("--cover", help="output few words that together contain all these pairs, e.g. 'Ty, rn'")
+    parser.add_argument("--stats", action="store_true", help="print the timings and rejection counts of the run to stderr")
+    return parser
+
+
+def main(args=None):
+    options = buildParser().parse_args(args)
+    engine = wordengine.WordEngine.fromFolder(options.dictionaries, options.cache)
+
+    if options.list:
+        for writingSystem in engine.dictionaries.writingSystems:
+            for language in engine.dictionaries.languagesByWS[writingSystem]:
+                print("%s/%s" % (writingSystem, language))
+        return 0
+
+    # options given on the command line are defaults for batch queries
+    defaults = {}
+    for key in ("dictionary", "wordCount", "minLength", "maxLength", "case", "charset", "matchPattern"):
+        value = getattr(options, key)
+        if value is not None:
+            defaults[key] = value
+    if options.requiredLetters:
+        defaults["requiredLetters"] = options.requiredLetters
+    if options.requiredGroups:
+        defaults["requiredGroups"] = options.requiredGroups
+    if options.requiredSequences:
+        defaults["requiredSequences"] = options.requiredSequences
+    if options.matchPattern is not None:
+        defaults["matchMode"] = "grep"
+    if options.banRepetitions:
+        defaults["banRepetitions"] = True
+
+    output = io.open(options.output, "w", encoding="utf-8") if options.output else sys.stdout
+    try:
+        if options.batch:
+            charsets = readCharsets(options.charsets) if options.charsets else None
+            failed = runBatch(engine, readSpecs(options.batch), output, defaults, options.seed, options.jobs,
+                              charsets, options.all_languages)
+            return 1 if failed else 0
+        if "dictionary" not in defaults:
+            print("wordcli: please give a --dictionary or a --batch file (see --list)", file=sys.stderr)
+            return 2
+        try:
+            query = wordengine.WordQuery.fromDict(defaults)
+            query.seed = options.seed
+            if options.total:
+                output.write("%d\n" % engine.countMatches(query))
+            elif options.cover:
+                words, uncovered = engine.coverPairs(query, None, wordengine.splitList(options.cover))
+                output.write(" ".join(words) + "\n")
+                if uncovered:
+                    print("wordcli: no matching word contains %s" % ", ".join(uncovered), file=sys.stderr)
+            elif options.all:
+                for w in engine.allMatches(query, options.sort):
+                    output.write(w + "\n")
+            elif options.page is not None:
+                output.write(" ".join(engine.page(query, options.page)) + "\n")
+            else:
+                stats = wordstats.RunStats() if options.stats else None
+                writeStream(engine.stream(query, repeat=options.repeat, stats=stats), output, query.wordCount)
+                if stats is not None:
+                    print("wordcli: %s" % stats.summary(), file=sys.stderr)
+        except (KeyError, ValueError, re.error) as e:
+            print("wordcli: %s" % e, file=sys.stderr)
+            return 1
+        return 0
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# coding=utf-8
+"""
+Kerning pair coverage for word-o-mat.
+
+Finds a small set of words that together contain every pair of a list, or
+every pair kerned in a font master, so kerning can be checked in real words.
+Each word covers the targets of its adjacent character pairs; a target is a
+character pair, or with kerning groups, the pair of kerning keys (group or
+glyph) that applies to it. Picking the fewest words is a set cover problem,
+solved greedily: always take the word that covers the most targets not
+covered yet. Gains only ever shrink, so they are kept in a heap and only
+recomputed when they reach the top (lazy evaluation).
+"""
+import heapq
+import random
+
+
+def leftKey(metrics, char):
+    """Return the kerning key of a character on the left side of a pair: its group, or its glyph."""
+    keys = metrics.kerningKeys.get(char)
+    if keys is None:
+        return char
+    return keys[1] or keys[0]
+
+
+def rightKey(metrics, char):
+    """Return the kerning key of a character on the right side of a pair: its group, or its glyph."""
+    keys = metrics.kerningKeys.get(char)
+    if keys is None:
+        return char
+    return keys[2] or keys[0]
+
+
+def pairTargets(pairs, metrics=None, groups=False):
+    """Return (targets, keysOf) for a list of two-character strings.
+
+    keysOf(pair) returns the targets a pair of adjacent characters covers. With groups, pairs
+    are collapsed to the kerning groups of metrics, so e.g. "To" also covers "Tó".
+    """
+    pairs = [p for p in pairs if len(p) == 2]
+    if not groups or metrics is None:
+        return set(pairs), lambda pair: (pair,)
+
+    def keysOf(pair):
+        return ((leftKey(metrics, pair[0]), rightKey(metrics, pair[1])),)
+    return set(keysOf(p)[0] for p in pairs), keysOf
+
+
+def kerningTargets(metrics, alphabet, groups=True):
+    """Return (targets, keysOf) for all pairs with a kerning value in metrics.
+
+    With groups, the targets are the kerning entries themselves (group and exception pairs)
+    that apply to characters of the font; a pair of characters covers the one entry it uses, found
+    in the same order as FontMetrics.kern (exception before group kerning).
+    Without groups, they are the pairs of characters of alphabet with a non-zero kerning.
+    """
+    if not groups:
+        kern = metrics.kern
+        targets = set(a + b for a in alphabet for b in alphabet if kern(a, b))
+        return targets, lambda pair: (pair,)
+
+    kerningKeys, kerning = metrics.kerningKeys, metrics.kerning
+    leftKeys = set(k for keys in kerningKeys.values() for k in keys[:2] if k)
+    rightKeys = set(k for keys in kerningKeys.values() for k in (keys[0], keys[2]) if k)
+    targets = set(key for key in kerning if key[0] in leftKeys and key[1] in rightKeys)
+
+    def keysOf(pair):
+        left, right = kerningKeys.get(pair[0]), kerningKeys.get(pair[1])
+        if left is None or right is None:
+            return ()
+        for key in ((left[0], right[0]), (left[0], right[2]), (left[1], right[0]), (left[1], right[2])):
+            if key in kerning:
+                return (key,)
+        return ()
+    return targets, keysOf
+
+
+def coverWords(words, targets, keysOf, rng=random):
+    """Return (indices of the chosen words, targets no word covers).
+
+    Words are taken greedily by the number of new targets they cover; ties go to the shorter
+    word, then at random.
+    """
+    keysByPair = {}
+    heap = []
+    coverable = set()
+    for i, w in enumerate(words):
+        covers = set()
+        for j in range(len(w) - 1):
+            pair = w[j:j + 2]
+            keys = keysByPair.get(pair)
+            if keys is None:
+                keys = keysByPair[pair] = tuple(k for k in keysOf(pair) if k in targets)
+            covers.update(keys)
+        if covers:
+            coverable.update(covers)
+            heap.append((-len(covers), len(w), rng.random(), i, covers))
+    heapq.heapify(heap)
+
+    chosen = []
+    covered = set()
+    while heap and len(covered) < len(coverable):
+        negativeGain, length, tiebreak, i, covers = heapq.heappop(heap)
+        gain = len(covers - covered)
+        if gain == -negativeGain:
+            # still the best, as no other word's gain can have grown
+            chosen.append(i)
+            covered |= covers
+        elif gain:
+            heapq.heappush(heap, (-gain, length, tiebreak, i, covers))
+    return chosen, targets - coverable
+
+
+def targetNames(targets, metrics=None):
+    """Return sorted readable names of targets: the characters, with "@" and the name for kerning groups."""
+    charsByKey = {}
+    if metrics is not None:
+        for char, keys in metrics.kerningKeys.items():
+            charsByKey.setdefault(keys[0], char)
+    names = []
+    for target in targets:
+        if isinstance(target, str):
+            names.append(target)
+            continue
+        sides = []
+        for key in target:
+            if key.startswith("@MMK_"):
+                sides.append("@" + key[7:])
+            else:
+                sides.append(charsByKey.get(key, key))
+        names.append("/".join(sides))
+    return sorted(names)
@@ -0,0 +1,251 @@
+# coding=utf-8
+"""
+Dictionary registry for word-o-mat.
+
+Only the file names of the bundled wordlists (and of the wordlists imported
+from corpora, see wordimport) are scanned when the window opens; a list is
+read from disk the first time it is requested and kept in a bounded LRU cache
+afterwards.
+"""
+from __future__ import print_function
+
+import codecs
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import wordcache
+
+contentLimit = '*****'  # If a header exists, ignore lines before this delimiter
+userDictPath = '/usr/share/dict/words'
+
+
+def readWordlist(filePath):
+    """Read a wordlist file and return its lines, skipping an optional header."""
+    with codecs.open(filePath, mode="r", encoding="utf-8") as fo:
+        lines = fo.read().splitlines()
+    try:
+        contentStart = lines.index(contentLimit) + 1
+        lines = lines[contentStart:]
+    except ValueError:
+        pass
+    return lines
+
+
+def lengthOffsetsFor(words):
+    """Return the length offsets of a list of words sorted by length.
+
+    offsets[n] is the ID of the first word with at least n characters; the
+    last entry is the number of words.
+    """
+    offsets = [0]
+    for i, w in enumerate(words):
+        while len(offsets) <= len(w):
+            offsets.append(i)
+    offsets.append(len(words))
+    return offsets
+
+
+def lengthRange(words, minLength, maxLength):
+    """Return the (start, stop) range of IDs of the words with minLength to maxLength characters.
+
+    words must be a WordList or a compiled wordlist, i.e. sorted by length with lengthOffsets.
+    """
+    offsets = words.lengthOffsets
+    last = len(offsets) - 1
+    minLength = min(max(minLength, 0), last)
+    maxLength = min(max(maxLength + 1, minLength), last)
+    return offsets[minLength], offsets[maxLength]
+
+
+class WordList(list):
+    """A list of words sorted by length, so every length forms one contiguous bucket.
+
+    Attributes:
+    lengthOffsets (list): See lengthOffsetsFor.
+    """
+
+    def __init__(self, words=()):
+        list.__init__(self, sorted(words, key=len))
+        self.lengthOffsets = lengthOffsetsFor(self)
+
+
+def wordlistSize(words):
+    """Estimate the memory used by a loaded wordlist, in bytes."""
+    if hasattr(words, "nbytes"):
+        return words.nbytes
+    return sys.getsizeof(words) + sum(sys.getsizeof(w) for w in words)
+
+
+class DictionaryRegistry(object):
+    """Knows which wordlists exist and loads them on demand.
+
+    Attributes:
+    dictFolder (str):       Folder holding one subfolder of .txt wordlists per writing system.
+    languagesByWS (dict):   Maps writing system -> list of language names.
+    writingSystems (list):  Sorted list of writing system names.
+    maxEntries (int):       Maximum number of wordlists kept in memory (0 = no limit).
+    maxBytes (int):         Approximate memory limit for the loaded wordlists (0 = no limit).
+    cacheFolder (str):      Folder for compiled wordlists (see wordcache), or None to always parse the .txt files.
+    importFolder (str):     Folder holding one subfolder of imported .wordlist files per writing system, or None.
+
+    A registry can be shared by threads (e.g. the match preview and a generation running in the
+    background): loading, building derived structures and eviction are serialized by one lock.
+    """
+
+    def __init__(self, dictFolder, maxEntries=4, maxBytes=0, userDict=userDictPath, cacheFolder=None, importFolder=None):
+        self.dictFolder = dictFolder
+        self.cacheFolder = cacheFolder
+        self.importFolder = importFolder
+        self.userDict = userDict
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.languagesByWS = {}
+        self.writingSystems = []
+        self._paths = {}  # (writingSystem, language) -> file path
+        self._cache = OrderedDict()  # (writingSystem, language) -> (words, size)
+        self._derived = {}  # (writingSystem, language) -> {name: (structure, size)}
+        self._cacheBytes = 0
+        self._lock = threading.RLock()
+        self.scan()
+
+    def scan(self):
+        """Fill languagesByWS from the file names in the dictionaries and import folders, without reading any file."""
+        with self._lock:
+            self.languagesByWS = {}
+            self._paths = {}
+            for folder, extension in ((self.dictFolder, ".txt"), (self.importFolder, ".wordlist")):
+                if not folder or not os.path.isdir(folder):
+                    continue
+                for writingSystem in os.listdir(folder):
+                    wsPath = os.path.join(folder, writingSystem)
+                    if not os.path.isdir(wsPath):
+                        continue
+                    self.languagesByWS.setdefault(writingSystem, [])
+                    for fileName in sorted(os.listdir(wsPath)):
+                        if fileName.lower().endswith(extension):
+                            language = os.path.splitext(fileName)[0]
+                            self.register(writingSystem, language, os.path.join(wsPath, fileName))
+            if self.userDict and os.path.exists(self.userDict):
+                self.register("User", "user", self.userDict)
+            self.writingSystems = sorted(self.languagesByWS.keys())
+
+    def register(self, writingSystem, language, filePath):
+        """Make a wordlist file available under the given writing system and language."""
+        with self._lock:
+            languages = self.languagesByWS.setdefault(writingSystem, [])
+            if language not in languages:
+                languages.append(language)
+            if writingSystem not in self.writingSystems:
+                self.writingSystems.append(writingSystem)
+            self._paths[(writingSystem, language)] = filePath
+            self.discard(writingSystem, language)
+
+    def entries(self):
+        """Return (writing system, language, file path) for all registered wordlists."""
+        return [(ws, language, self._paths[(ws, language)])
+                for ws in self.writingSystems for language in self.languagesByWS[ws]]
+
+    def path(self, writingSystem, language):
+        """Return the file path of a registered wordlist."""
+        return self._paths[(writingSystem, language)]
+
+    def __contains__(self, key):
+        return key in self._paths
+
+    def isLoaded(self, writingSystem, language):
+        """Check whether a wordlist is currently held in the cache."""
+        return (writingSystem, language) in self._cache
+
+    def get(self, writingSystem, language):
+        """Return the words of a wordlist, loading it if necessary.
+
+        Raises KeyError for unknown dictionaries and IOError/UnicodeDecodeError if the file can't be read.
+        """
+        with self._lock:
+            key = (writingSystem, language)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key][0]
+            words = self.load(self._paths[key])
+            size = wordlistSize(words)
+            self._cache[key] = (words, size)
+            self._cacheBytes += size
+            self._evict()
+            return words
+
+    def derived(self, writingSystem, language, name, build):
+        """Return a structure derived from a wordlist (e.g. an index), building it with build(words) on first use.
+
+        Derived structures are counted towards maxBytes and dropped together with their wordlist.
+        """
+        with self._lock:
+            key = (writingSystem, language)
+            words = self.get(writingSystem, language)
+            structures = self._derived.setdefault(key, {})
+            if name not in structures:
+                structure = build(words)
+                size = getattr(structure, "nbytes", 0)
+                structures[name] = (structure, size)
+                self._cacheBytes += size
+                self._evict()
+            return structures[name][0]
+
+    def discardDerived(self, writingSystem, language, name):
+        """Drop one derived structure of a wordlist, e.g. because it is out of date."""
+        with self._lock:
+            structures = self._derived.get((writingSystem, language), {})
+            entry = structures.pop(name, None)
+            if entry is not None:
+                self._cacheBytes -= entry[1]
+
+    def load(self, filePath):
+        """Read a wordlist file from disk, through the compiled cache if one is configured.
+
+        The words are returned sorted by length (see WordList). If the cache can't be written or read, the .txt file is parsed directly.
+        Imported .wordlist files are compiled already and mapped as they are.
+        """
+        if filePath.endswith(".wordlist"):
+            return wordcache.MappedWordList(filePath)
+        if self.cacheFolder is not None:
+            try:
+                return wordcache.loadWordlist(filePath, self.cacheFolder)
+            except (IOError, OSError, ValueError) as e:
+                print("word-o-mat: could not use compiled wordlist for %s (%s)" % (filePath, e))
+        return WordList(readWordlist(filePath))
+
+    def discard(self, writingSystem, language):
+        """Drop a wordlist from the cache."""
+        with self._lock:
+            key = (writingSystem, language)
+            entry = self._cache.pop(key, None)
+            if entry is not None:
+                self._cacheBytes -= entry[1]
+            self._dropDerived(key)
+
+    def _dropDerived(self, key):
+        """Drop the structures derived from a wordlist."""
+        for structure, size in self._derived.pop(key, {}).values():
+            self._cacheBytes -= size
+
+    def clear(self):
+        """Drop all loaded wordlists."""
+        with self._lock:
+            self._cache.clear()
+            self._derived.clear()
+            self._cacheBytes = 0
+
+    def _evict(self):
+        """Drop least recently used wordlists until the cache is within its limits.
+
+        The most recently used list is always kept, even if it alone exceeds maxBytes.
+        """
+        while len(self._cache) > 1:
+            tooMany = self.maxEntries and len(self._cache) > self.maxEntries
+            tooBig = self.maxBytes and self._cacheBytes > self.maxBytes
+            if not (tooMany or tooBig):
+                break
+            key, (words, size) = self._cache.popitem(last=False)
+            self._cacheBytes -= size
+            self._dropDerived(key)
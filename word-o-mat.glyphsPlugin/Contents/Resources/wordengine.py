@@ -0,0 +1,679 @@
+# coding=utf-8
+"""
+Headless word generation for word-o-mat.
+
+The WordEngine holds the dictionary registry (and with it the loaded wordlists
+and their indexes) and turns a WordQuery into a list of words, or into a
+WordStream for output of any length. It has no dependencies on vanilla or
+GlyphsApp, so it runs the same inside the plugin window, from the command
+line (see wordcli) or in batch jobs.
+"""
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import wordcache
+import wordcheck
+import wordcover
+import worddicts
+import wordgrep
+import wordindex
+import wordlines
+import wordsample
+import wordwidth
+
+caseModes = ["keep", "lower", "capitalize", "upper", "ransom"]  # index = case pop-up value
+casedModes = (1, 2, 3)  # case modes applied to whole dictionaries (see casedWordList)
+defaultDictFolder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dictionaries")
+listPattern = re.compile(" *, *| +")
+
+
+def splitList(value):
+    """Split a list of characters written like in the plugin window ("a, b c") into its items."""
+    return [item for item in listPattern.split(value.strip()) if item]
+
+
+def ransom(s, rng=random):
+    """Randomly convert the case in the string s so that
+    it looks like a ransom note.
+    """
+
+    def flip(c):
+        if rng.random() < 0.5:
+            return c.lower()
+        else:
+            return c.upper()
+    return "".join(flip(c) for c in s)
+
+
+def applyCase(w, case, rng=random):
+    """Apply a case mode (index into caseModes) to a word; rng is used by the ransom mode."""
+    if case == 1:
+        w = w.lower()
+    elif case == 2:
+        try:
+            ijs = ["ij", "IJ", "Ij"]
+            # Note: Adjust this section if needed based on the language selected.
+            if w[:2] in ijs:
+                w = "IJ" + w[2:]
+            else:
+                w = w.title()
+        except IndexError:
+            w = w.title()
+    elif case == 3:
+        if u"ß" in w:
+            w = w.replace(u"ß", "ss")
+        w = w.upper()
+    elif case == 4:
+        w = ransom(w, rng)
+    return w
+
+
+def finishCase(w, case, rng=random):
+    """Apply the part of a case mode that is left for the final words: the random casing of ransom notes.
+
+    The other case modes are applied to the whole dictionary before any word is checked (see casedWordList).
+    """
+    if case == 4:
+        return ransom(w, rng)
+    return w
+
+
+def casedWordList(words, case):
+    """Return the distinct words of a wordlist in a case mode from casedModes, sorted by length (see worddicts.WordList)."""
+    seen = set()
+    cased = []
+    for w in words:
+        w = applyCase(w, case)
+        if w not in seen:
+            seen.add(w)
+            cased.append(w)
+    cased = worddicts.WordList(cased)
+    cased.nbytes = worddicts.wordlistSize(cased)
+    return cased
+
+
+casedWordsBuilders = {case: wordcache.cachedStructure("case-" + caseModes[case],
+                                                      lambda words, case=case: casedWordList(words, case))
+                      for case in casedModes}
+
+
+class WordQuery(object):
+    """All settings of one word generation run.
+
+    Attributes:
+    writingSystem (str):    Writing system of the dictionary, e.g. "Latin".
+    language (str):         Language of the dictionary, e.g. "English".
+    wordCount (int):        Number of words wanted.
+    minLength (int):        Minimal word length (inclusive).
+    maxLength (int):        Maximal word length (inclusive).
+    case (int):             Case mode, an index into caseModes.
+    charset (frozenset):    Characters words may use, or None for any characters.
+    requiredLetters (list): Letters required in each word (text mode).
+    requiredGroups (list of lists): Groups from each of which 1 member is required (text mode).
+    requiredSequences (list): Character sequences required in each word, e.g. "Ty" or "ffi" (text mode).
+    matchMode (string):     Match mode to be used ("text" or "grep").
+    matchPattern (str):     Regular expression to be matched (grep mode).
+    banRepetitions (Bool):  Signals whether repeating letters are banned.
+    seed (int):             Random seed, or None for a different result every time.
+    """
+
+    fields = ["writingSystem", "language", "wordCount", "minLength", "maxLength", "case", "charset",
+              "requiredLetters", "requiredGroups", "requiredSequences", "matchMode", "matchPattern", "banRepetitions",
+              "seed"]
+
+    def __init__(self, writingSystem, language, wordCount=20, minLength=3, maxLength=15, case=0, charset=None,
+                 requiredLetters=(), requiredGroups=(), matchMode="text", matchPattern="", banRepetitions=False,
+                 seed=None, requiredSequences=()):
+        self.writingSystem = writingSystem
+        self.language = language
+        self.wordCount = wordCount
+        self.minLength = minLength
+        self.maxLength = maxLength
+        self.case = case
+        self.charset = frozenset(charset) if charset is not None else None
+        self.requiredLetters = list(requiredLetters)
+        self.requiredGroups = [list(g) for g in requiredGroups]
+        self.requiredSequences = [s for s in requiredSequences if s]
+        self.matchMode = matchMode
+        self.matchPattern = matchPattern
+        self.banRepetitions = banRepetitions
+        self.seed = seed
+
+    @classmethod
+    def fromDict(cls, spec):
+        """Build a query from a dict, e.g. one entry of a batch file.
+
+        "dictionary" may be given as "Writing system/language" instead of the two separate keys;
+        "case" may be a name from caseModes; "charset" may be a string of characters;
+        "requiredLetters", "requiredSequences" and groups may be strings like "a, b" and
+        "requiredGroups" a string of such groups separated by "|".
+        """
+        spec = dict(spec)
+        if "dictionary" in spec:
+            spec["writingSystem"], spec["language"] = spec.pop("dictionary").split("/", 1)
+        if "writingSystem" not in spec or "language" not in spec:
+            raise ValueError("No dictionary given")
+        if isinstance(spec.get("case"), str) and not spec["case"].isdigit():
+            spec["case"] = caseModes.index(spec["case"])
+        if isinstance(spec.get("requiredLetters"), str):
+            spec["requiredLetters"] = splitList(spec["requiredLetters"])
+        if isinstance(spec.get("requiredSequences"), str):
+            spec["requiredSequences"] = splitList(spec["requiredSequences"])
+        if isinstance(spec.get("requiredGroups"), str):
+            spec["requiredGroups"] = spec["requiredGroups"].split("|")
+        if "requiredGroups" in spec:
+            spec["requiredGroups"] = [splitList(g) if isinstance(g, str) else g for g in spec["requiredGroups"]]
+        for key in ("wordCount", "minLength", "maxLength", "case", "seed"):
+            if spec.get(key) is not None:
+                spec[key] = int(spec[key])
+        unknown = set(spec) - set(cls.fields)
+        if unknown:
+            raise ValueError("Unknown query fields: %s" % ", ".join(sorted(unknown)))
+        return cls(**spec)
+
+    def toDict(self):
+        """Return the query as a dict that fromDict accepts."""
+        spec = {name: getattr(self, name) for name in self.fields}
+        if self.charset is not None:
+            spec["charset"] = "".join(sorted(self.charset))
+        return spec
+
+    def filterKey(self):
+        """Return a hashable key of the settings that decide which words match (not how many or in which order)."""
+        return (self.writingSystem, self.language, self.minLength, self.maxLength, self.case, self.charset,
+                tuple(self.requiredLetters), tuple(tuple(g) for g in self.requiredGroups),
+                tuple(self.requiredSequences), self.matchMode, self.matchPattern, self.banRepetitions)
+
+
+class WordEngine(object):
+    """Generates words from the dictionaries of a DictionaryRegistry.
+
+    Attributes:
+    dictionaries (DictionaryRegistry): The available wordlists; loaded lists and their indexes are reused across queries.
+    maxMatchSets (int):     Number of match sets (see matchingIDs) kept for paging.
+
+    An engine may be used by more than one thread at a time; its match set cache is guarded by a lock.
+    """
+
+    def __init__(self, dictionaries, maxMatchSets=8):
+        self.dictionaries = dictionaries
+        self.maxMatchSets = maxMatchSets
+        self._matchSets = OrderedDict()  # filterKey -> (words, IDs)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fromFolder(cls, dictFolder=defaultDictFolder, cacheFolder=None, maxEntries=0, maxBytes=0, userDict=worddicts.userDictPath,
+                   importFolder=None):
+        """Create an engine for a dictionaries folder, with compiled wordlists in cacheFolder and imported ones in importFolder."""
+        if cacheFolder is None:
+            cacheFolder = wordcache.defaultCacheFolder()
+        if importFolder is None:
+            importFolder = wordcache.defaultImportFolder()
+        registry = worddicts.DictionaryRegistry(dictFolder, maxEntries=maxEntries, maxBytes=maxBytes,
+                                                userDict=userDict, cacheFolder=cacheFolder, importFolder=importFolder)
+        return cls(registry)
+
+    def words(self, query):
+        """Return the wordlist selected by a query, in its case mode (see casedWords); raises KeyError for unknown dictionaries."""
+        if (query.writingSystem, query.language) not in self.dictionaries:
+            raise KeyError("Unknown dictionary: %s/%s" % (query.writingSystem, query.language))
+        return self.casedWords(query.writingSystem, query.language, query.case)
+
+    def casedWords(self, writingSystem, language, case=0):
+        """Return the words of a dictionary in a case mode.
+
+        For the modes in casedModes, that is the distinct words with the case changed (see casedWordList),
+        built on first use and stored with the compiled wordlist; otherwise the dictionary itself, as
+        ransom notes are only applied to the final words.
+        """
+        if case not in casedModes:
+            return self.dictionaries.get(writingSystem, language)
+        return self.dictionaries.derived(writingSystem, language, "case-" + caseModes[case], casedWordsBuilders[case])
+
+    def casedDerived(self, writingSystem, language, case, name, build):
+        """Return build(words) for the words of a dictionary in a case mode (see casedWords), stored with the compiled wordlist.
+
+        Every case variant gets a structure of its own, named name and the case mode, e.g. "charindex-upper".
+        """
+        if case in casedModes:
+            name = "%s-%s" % (name, caseModes[case])
+            buildOnWords = build
+
+            def build(words):
+                return buildOnWords(self.casedWords(writingSystem, language, case))
+        return self.dictionaries.derived(writingSystem, language, name, wordcache.cachedStructure(name, build))
+
+    def charIndex(self, writingSystem, language, case=0):
+        """Return the character index of a dictionary in a case mode (see wordindex)."""
+        return self.casedDerived(writingSystem, language, case, "charindex", wordindex.CharIndex)
+
+    def joinedWords(self, writingSystem, language, case=0):
+        """Return a dictionary in a case mode joined into one string for grep searches (see wordgrep)."""
+        return self.casedDerived(writingSystem, language, case, "joined", wordgrep.JoinedWords)
+
+    def ngramIndex(self, writingSystem, language, case=0):
+        """Return the index of the character pairs and triples of a dictionary in a case mode (see wordindex)."""
+        return self.casedDerived(writingSystem, language, case, "ngrams", wordindex.NGramIndex)
+
+    def sequenceBits(self, query):
+        """Return the bitmap of the words containing all of query.requiredSequences, in the wordlist of the query (see words).
+
+        Single characters are looked up in the character index, longer sequences in the n-gram index.
+        """
+        words = self.words(query)
+        index = self.charIndex(query.writingSystem, query.language, query.case)
+        chars = [s for s in query.requiredSequences if len(s) == 1]
+        sequences = [s for s in query.requiredSequences if len(s) > 1]
+        bits = index.containingAll(chars) if chars else index.allBits
+        if bits and sequences:
+            ngrams = self.ngramIndex(query.writingSystem, query.language, query.case)
+            bits &= wordindex.postingsToBits(ngrams.containingAll(sequences, words), index.size)
+        return bits
+
+    def checker(self, query, grepped=False):
+        """Return a wordChecker for the requirements of a query, for words of its length range in its case mode.
+
+        The checker orders its predicates adaptively, by their cost and rejection rate for the words of this query.
+        With grepped, the words checked match the grep pattern already (see candidateWords), so it isn't matched again.
+        """
+        matchPatternRE = None
+        if query.matchMode == "grep" and not grepped:
+            matchPatternRE = wordgrep.compilePattern(query.matchPattern).regex
+        return wordcheck.wordChecker(query.charset is not None, query.charset or (), [],
+                                     query.requiredLetters, query.requiredGroups, matchPatternRE,
+                                     query.banRepetitions, query.minLength, query.maxLength,
+                                     matchMode=query.matchMode, checkLength=False, adaptive=True,
+                                     requiredSequences=query.requiredSequences)
+
+    def generate(self, query, rng=None, stats=None):
+        """Return up to query.wordCount random words matching the query.
+
+        All random choices are made with rng; if it is None, with a random.Random seeded with
+        query.seed (or the global generator if that is None too), so the same seed gives the same words.
+        With a wordstats.RunStats object, the timings and rejections of the run are recorded in it.
+        """
+        if query.wordCount <= 0:
+            return []
+        return self.stream(query, rng, stats=stats).take(query.wordCount)
+
+    def stream(self, query, rng=None, repeat=False, stats=None):
+        """Return a WordStream of the words matching a query (query.wordCount is ignored)."""
+        return WordStream(self, query, rng, repeat, stats)
+
+    def page(self, query, number, seed=None):
+        """Return page number (counting from 0) of a seeded random order of all words matching the query.
+
+        Pages have query.wordCount words. All matching words are found once (see matchingIDs) and
+        put in the order of a seeded Permutation, so any page is produced directly, without the
+        pages before it, and pages never repeat a word. In ransom mode the random casing is applied
+        to the words of the page only, with a random generator seeded for that page.
+        """
+        if seed is None:
+            seed = query.seed
+        if seed is None:
+            raise ValueError("Pages need a seed")
+        words = self.words(query)
+        ids = self.matchingIDs(query)
+        order = wordsample.Permutation(len(ids), seed)
+        result = [words[ids[k]] for k in order.page(number, query.wordCount)]
+        if query.case == 4:
+            rng = random.Random(wordsample.deriveSeed(seed, "page", number))
+            result = [ransom(w, rng) for w in result]
+        return result
+
+    def matchingIDs(self, query):
+        """Return the sorted IDs of all words matching the query in its wordlist (see words), one per distinct word.
+
+        In ransom mode, words are matched without their case changed. The result is kept for the
+        maxMatchSets most recent queries, so further pages of a query only cost their own words.
+        """
+        words = self.words(query)
+        key = query.filterKey()
+        with self._lock:
+            entry = self._matchSets.get(key)
+            if entry is not None and entry[0] is words:
+                self._matchSets.move_to_end(key)
+                return entry[1]
+        bits = self.matchingBits(query)
+        if bits is not None:
+            ids = wordindex.bitIndices(bits)
+        else:
+            idRange = worddicts.lengthRange(words, query.minLength, query.maxLength)
+            checker = self.checker(query)
+            seen = set()
+            ids = []
+            for i in range(*idRange):
+                w = words[i]
+                if checker.checkWord(w, seen):
+                    seen.add(w)
+                    ids.append(i)
+        with self._lock:
+            self._matchSets[key] = (words, ids)
+            while len(self._matchSets) > self.maxMatchSets:
+                self._matchSets.popitem(last=False)
+        return ids
+
+    def matchingBits(self, query):
+        """Return the bitmap of the words matching the query, from the indexes of its wordlist (see words).
+
+        Returns None for grep patterns that can't be searched over the joined list (see wordgrep.grepJoined);
+        those need every word checked on its own.
+        """
+        words = self.words(query)
+        textMode = query.matchMode == "text"
+        if not textMode:
+            grep = wordgrep.compilePattern(query.matchPattern)
+            if not grep.bulkSafe:
+                return None
+        index = self.charIndex(query.writingSystem, query.language, query.case)
+        idRange = worddicts.lengthRange(words, query.minLength, query.maxLength)
+        bits = wordindex.matchingBits(index, query.charset,
+                                      query.requiredLetters if textMode else (), query.requiredGroups if textMode else (),
+                                      idRange=idRange, banRepetitions=query.banRepetitions, unique=True)
+        if textMode and bits and query.requiredSequences:
+            bits &= self.sequenceBits(query)
+        if not textMode and bits:
+            joined = self.joinedWords(query.writingSystem, query.language, query.case)
+            bits &= wordindex.postingsToBits(wordgrep.grepJoined(joined, grep, idRange), index.size)
+        return bits
+
+    def countMatches(self, query):
+        """Return the exact number of distinct words matching the query (query.wordCount is ignored)."""
+        with self._lock:
+            entry = self._matchSets.get(query.filterKey())
+        if entry is None:
+            bits = self.matchingBits(query)
+            if bits is not None:
+                return wordindex.bitCount(bits)
+        return len(self.matchingIDs(query))
+
+    def allMatches(self, query, sort="alphabetical", start=0, count=None):
+        """Return all words matching the query, or count of them from position start on.
+
+        sort is "alphabetical" or "length" (shortest first, in dictionary order for equal lengths).
+        In ransom mode, the random casing is seeded with query.seed.
+        """
+        words = self.words(query)
+        ids = self.matchingIDs(query)
+        if sort == "alphabetical":
+            result = sorted(words[i] for i in ids)
+        elif sort == "length":
+            result = [words[i] for i in ids]
+        else:
+            raise ValueError("Unknown sort order: %s" % sort)
+        if start or count is not None:
+            result = result[start:None if count is None else start + count]
+        if query.case == 4:
+            rng = random.Random(query.seed) if query.seed is not None else random
+            result = [ransom(w, rng) for w in result]
+        return result
+
+    def candidateWords(self, query, rng=random):
+        """Yield the words of the selected wordlist (see words) that may match, in random order.
+
+        Only the length buckets inside the requested range are sampled. In text mode, the character
+        and n-gram indexes of the wordlist also narrow it down to the words passing the charset and
+        required letter/group/sequence requirements first, unless most words pass them anyway.
+        """
+        words = self.words(query)
+        idRange = worddicts.lengthRange(words, query.minLength, query.maxLength)
+        if query.matchMode == "grep":
+            return self.grepCandidates(query, words, idRange, rng)
+        filtered = query.charset is not None or query.requiredLetters or any(query.requiredGroups) or query.requiredSequences
+        if query.matchMode != "text" or not filtered:
+            return (words[i] for i in wordsample.shuffled(range(*idRange), rng))
+        index = self.charIndex(query.writingSystem, query.language, query.case)
+        bits = wordindex.matchingBits(index, query.charset, query.requiredLetters, query.requiredGroups, idRange=idRange)
+        if bits and query.requiredSequences:
+            bits &= self.sequenceBits(query)
+        if 2 * wordindex.bitCount(bits) >= idRange[1] - idRange[0]:
+            # most words pass, so sampling the range and leaving the rest to the checker beats listing the IDs
+            return (words[i] for i in wordsample.shuffled(range(*idRange), rng))
+        return (words[i] for i in wordsample.shuffled(wordindex.bitIndices(bits), rng))
+
+    def grepCandidates(self, query, words, idRange, rng=random, probeCount=2000):
+        """Yield the words in idRange matching the grep pattern, in random order.
+
+        The first probeCount random words are matched one by one, which is quickest for
+        common patterns. If that didn't turn up enough words, the rest of the range is
+        searched in one go over the newline-joined dictionary.
+        """
+        grep = wordgrep.compilePattern(query.matchPattern)
+        probed = set()
+        for i in wordsample.shuffled(range(*idRange), rng):
+            if len(probed) >= probeCount and grep.bulkSafe:
+                break
+            probed.add(i)
+            w = words[i]
+            if grep.matches(w):
+                yield w
+        else:
+            return
+        joined = self.joinedWords(query.writingSystem, query.language, query.case)
+        remaining = [i for i in wordgrep.grepJoined(joined, grep, idRange) if i not in probed]
+        for i in wordsample.shuffled(remaining, rng):
+            yield words[i]
+
+    def coverPairs(self, query, metrics, pairs=None, groups=False, rng=None):
+        """Return (words, uncovered): few words matching the query that together contain every pair.
+
+        pairs is a list of two-character strings, or None for all pairs kerned in metrics. With groups,
+        pairs are collapsed to the kerning groups of metrics (see wordcover). uncovered are the sorted
+        names of the pairs no matching word contains. metrics can be None for pairs without groups.
+        Random choices are made as in generate.
+        """
+        if rng is None:
+            rng = random.Random(query.seed) if query.seed is not None else random
+        words = self.words(query)
+        # the pairs of ransom notes depend on their random casing, so it is applied to all candidates here
+        candidates = [finishCase(words[i], query.case, rng) for i in self.matchingIDs(query)]
+        if pairs is None:
+            targets, keysOf = wordcover.kerningTargets(metrics, set("".join(candidates)), groups)
+        else:
+            targets, keysOf = wordcover.pairTargets(pairs, metrics, groups)
+        chosen, uncovered = wordcover.coverWords(candidates, targets, keysOf, rng)
+        return [candidates[i] for i in chosen], wordcover.targetNames(uncovered, metrics)
+
+    def fitLines(self, query, metrics, width, lineCount, tolerance=0, rng=None):
+        """Return up to lineCount lines of words matching the query, each as wide as width +/- tolerance in metrics.
+
+        Lines are lists of words; no word is used twice. Widths include the kerning inside the words
+        and the advance width of the space between them (see wordlines). Random choices are made as in generate.
+        """
+        if rng is None:
+            rng = random.Random(query.seed) if query.seed is not None else random
+        words = self.words(query)
+        ids = self.matchingIDs(query)
+        if query.case != 4:
+            table = self.widthTable(query.writingSystem, query.language, metrics, query.case)
+            fitter = wordlines.LineFitter(ids, table.widthsOf(ids), metrics.advance(" "))
+            return [[words[i] for i in line] for line in fitter.fitLines(width, lineCount, tolerance, rng)]
+        candidates = [ransom(words[i], rng) for i in ids]
+        fitter = wordlines.LineFitter(candidates, wordwidth.measureWords(candidates, metrics), metrics.advance(" "))
+        return fitter.fitLines(width, lineCount, tolerance, rng)
+
+    def widthMatches(self, query, metrics, minWidth, maxWidth, rng=None):
+        """Return up to query.wordCount words matching the query that are minWidth to maxWidth wide in metrics, narrowest first.
+
+        With more words in range, a random choice of them is returned. If minWidth equals maxWidth, the words
+        closest to that width are returned instead, closest first. Widths include the kerning inside the words
+        and come from the WidthTable of the dictionary (see widthTable). Random choices are made as in generate.
+        """
+        if rng is None:
+            rng = random.Random(query.seed) if query.seed is not None else random
+        words = self.words(query)
+        ids = self.matchingIDs(query)
+        count = query.wordCount
+        if query.case == 4:
+            # the width of a ransom note depends on its random casing, so the candidates are measured here
+            words = [ransom(words[i], rng) for i in ids]
+            widths = wordwidth.measureWords(words, metrics)
+            if minWidth == maxWidth:
+                return [words[k] for k in sorted(range(len(words)), key=lambda k: abs(widths[k] - minWidth))[:count]]
+            inRange = [k for k in range(len(words)) if minWidth <= widths[k] <= maxWidth]
+            return [words[k] for k in sorted(rng.sample(inRange, min(count, len(inRange))), key=widths.__getitem__)]
+        table = self.widthTable(query.writingSystem, query.language, metrics, query.case)
+        matching = set(ids)
+        if minWidth == maxWidth:
+            # the nearest words of the whole dictionary, until enough of them match the query
+            size = count
+            while True:
+                nearest = table.nearest(minWidth, size)
+                result = [i for i in nearest if i in matching]
+                if len(result) >= count or len(nearest) < size:
+                    break
+                size *= 4
+            return [words[i] for i in result[:count]]
+        result = [i for i in table.inRange(minWidth, maxWidth) if i in matching]
+        if len(result) > count:
+            chosen = set(rng.sample(result, count))
+            result = [i for i in result if i in chosen]
+        return [words[i] for i in result]
+
+    def widthTable(self, writingSystem, language, metrics, case=0):
+        """Return the widths of all words of a dictionary in a case mode (see casedWords) for a FontMetrics object (see wordwidth)."""
+        name = "widths" if case not in casedModes else "widths-" + caseModes[case]
+
+        def build(words):
+            return wordwidth.WidthTable(self.casedWords(writingSystem, language, case), metrics)
+        table = self.dictionaries.derived(writingSystem, language, name, build)
+        if table.metrics is not metrics:
+            self.dictionaries.discardDerived(writingSystem, language, name)
+            table = self.dictionaries.derived(writingSystem, language, name, build)
+        return table
+
+
+class WordStream(object):
+    """The words matching a query, produced lazily as they are consumed.
+
+    The dictionary is walked in random order and every candidate is checked only when the next
+    word is asked for, so a consumer can take a few words, stop, and come back for more later.
+    Memory use depends on the size of the dictionary, not on the number of words taken.
+
+    Attributes:
+    query (WordQuery):  The query.
+    repeat (Bool):      Signals whether to start over in a new random order when all matching words were used.
+    produced (int):     Number of words produced so far.
+    cancelled (Bool):   Set by cancel(); the stream ends at the next candidate word.
+    exhausted (Bool):   Signals whether the stream has ended.
+    stats (RunStats):   If not None, collects the timings and rejection counts of the stream (see wordstats).
+    """
+
+    def __init__(self, engine, query, rng=None, repeat=False, stats=None):
+        if rng is None:
+            rng = random.Random(query.seed) if query.seed is not None else random
+        self.engine = engine
+        self.query = query
+        self.repeat = repeat
+        self.produced = 0
+        self.cancelled = False
+        self.exhausted = False
+        self.stats = stats
+        self._rng = rng
+        self._words = self._generate() if stats is None else self._generateCounted()
+
+    def _generate(self):
+        query, rng = self.query, self._rng
+        checker = self.engine.checker(query, grepped=True)
+        while True:
+            foundWords = set()  # words of this pass, for the duplicate check
+            for w in self.engine.candidateWords(query, rng):
+                if self.cancelled:
+                    return
+                if checker.checkWord(w, foundWords):
+                    foundWords.add(w)
+                    yield finishCase(w, query.case, rng)
+            if not self.repeat or not foundWords:
+                return
+
+    def _generateCounted(self):
+        """_generate, timing every step and counting the rejections in self.stats."""
+        query, rng, stats = self.query, self._rng, self.stats
+        clock = time.perf_counter
+        with stats.phase("checker"):
+            checker = self.engine.checker(query, grepped=True)
+        while True:
+            foundWords = set()
+            with stats.phase("candidates"):
+                candidates = iter(self.engine.candidateWords(query, rng))
+            sampleTime = caseTime = checkTime = 0.0
+            while not self.cancelled:
+                start = clock()
+                w = next(candidates, None)
+                sampled = clock()
+                sampleTime += sampled - start
+                if w is None:
+                    break
+                stats.sampled += 1
+                rejection = checker.rejection(w, foundWords)
+                checked = clock()
+                checkTime += checked - sampled
+                if rejection is not None:
+                    stats.reject(rejection)
+                    continue
+                foundWords.add(w)
+                stats.accepted += 1
+                w = finishCase(w, query.case, rng)
+                caseTime += clock() - checked
+                # the consumer may stop at any word, so the times are recorded before every one
+                self._addTimes(sampleTime, caseTime, checkTime)
+                stats.predicateOrder = checker.order()
+                sampleTime = caseTime = checkTime = 0.0
+                yield w
+            self._addTimes(sampleTime, caseTime, checkTime)
+            stats.predicateOrder = checker.order()
+            if self.cancelled or not self.repeat or not foundWords:
+                return
+
+    def _addTimes(self, sampleTime, caseTime, checkTime):
+        stats = self.stats
+        stats.addTime("sample", sampleTime)
+        if self.query.case == 4:
+            stats.addTime("case", caseTime)
+        stats.addTime("check", checkTime)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.exhausted:
+            raise StopIteration
+        try:
+            w = next(self._words)
+        except StopIteration:
+            self.exhausted = True
+            raise
+        self.produced += 1
+        return w
+
+    next = __next__
+
+    def take(self, count):
+        """Return the next count words (fewer if the stream ends first)."""
+        words = []
+        if count <= 0:
+            return words
+        for w in self:
+            words.append(w)
+            if len(words) >= count:
+                break
+        return words
+
+    def chunks(self, size, limit=None):
+        """Yield lists of up to size words until the stream ends or limit words were produced in total."""
+        while not self.exhausted:
+            count = size if limit is None else min(size, limit - self.produced)
+            if count <= 0:
+                return
+            chunk = self.take(count)
+            if not chunk:
+                return
+            yield chunk
+
+    def cancel(self):
+        """Stop the stream; safe to call from another thread while words are being produced."""
+        self.cancelled = True
@@ -0,0 +1,239 @@
+# coding=utf-8
+"""
+GREP match mode engine for word-o-mat.
+
+Compiled patterns are kept in an LRU cache keyed by the pattern string.
+Literal substrings a pattern requires, and its anchors (e.g. ^t or nn$),
+are extracted so candidates can be rejected with cheap string tests before
+the full regular expression runs. For whole dictionaries, one regular
+expression search over the newline-joined list replaces a separate search
+per word.
+"""
+import re
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+
+try:
+    import re._parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+LITERAL = sre_constants.LITERAL
+SUBPATTERN = sre_constants.SUBPATTERN
+AT = sre_constants.AT
+# possessive repeats and atomic groups (Python 3.11+) only change backtracking, not what a match contains
+repeatOps = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) + tuple(
+    getattr(sre_constants, name) for name in ("POSSESSIVE_REPEAT",) if hasattr(sre_constants, name))
+ATOMIC_GROUP = getattr(sre_constants, "ATOMIC_GROUP", None)
+startAnchors = (sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_STRING)
+endAnchors = (sre_constants.AT_END, sre_constants.AT_END_STRING)
+# constructs that behave differently when a pattern runs over the joined list instead of a single word
+bulkUnsafe = (sre_constants.ASSERT, sre_constants.ASSERT_NOT)
+bulkUnsafeAnchors = (sre_constants.AT_BEGINNING_STRING, sre_constants.AT_END_STRING)
+
+
+@lru_cache(maxsize=64)
+def compilePattern(pattern, flags=0):
+    """Return a GrepPattern for a pattern string; raises re.error if it doesn't compile."""
+    return GrepPattern(re.compile(pattern, flags))
+
+
+def grepPattern(regex):
+    """Return the GrepPattern for an already compiled regular expression."""
+    return compilePattern(regex.pattern, regex.flags)
+
+
+def _flatten(items):
+    """Inline plain groups into the surrounding sequence and expand fixed repetitions of literals."""
+    result = []
+    for op, av in items:
+        if op is SUBPATTERN and not av[-3] and not av[-2]:  # group without inline flags
+            result.extend(_flatten(av[-1]))
+        elif op is ATOMIC_GROUP and ATOMIC_GROUP is not None:
+            result.extend(_flatten(av))
+        elif op in repeatOps and av[0] == av[1] and av[0] < 16:
+            body = _flatten(av[2])
+            if all(o is LITERAL for o, a in body):
+                result.extend(body * av[0])
+            else:
+                result.append((op, av))
+        else:
+            result.append((op, av))
+    return result
+
+
+def _walk(items):
+    """Yield all (op, av) nodes of a parsed pattern, recursively."""
+    for op, av in items:
+        yield op, av
+        if op is SUBPATTERN:
+            for node in _walk(av[-1]):
+                yield node
+        elif op is ATOMIC_GROUP and ATOMIC_GROUP is not None:
+            for node in _walk(av):
+                yield node
+        elif op in repeatOps:
+            for node in _walk(av[2]):
+                yield node
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                for node in _walk(branch):
+                    yield node
+        elif op in bulkUnsafe:
+            for node in _walk(av[1]):
+                yield node
+
+
+def analyzePattern(regex):
+    """Return (prefix, suffix, literals, bulkSafe) for a compiled regular expression.
+
+    prefix/suffix are the literal text the pattern is anchored to at the start/end of a word,
+    literals are further substrings every match has to contain. All of them are necessary
+    conditions only; a word passing them still needs to be searched with the full pattern.
+    """
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except Exception:
+        return "", "", (), False
+    bulkSafe = True
+    for op, av in _walk(list(parsed)):
+        if op in bulkUnsafe or (op is AT and av in bulkUnsafeAnchors):
+            bulkSafe = False
+            break
+    if parsed.state.flags & re.IGNORECASE:
+        return "", "", (), bulkSafe
+
+    items = _flatten(list(parsed))
+    runs = []  # (start index, end index, text) of consecutive literals
+    current = []
+    for i, (op, av) in enumerate(items + [(None, None)]):
+        if op is LITERAL:
+            current.append(chr(av))
+            continue
+        if current:
+            runs.append((i - len(current), i, "".join(current)))
+            current = []
+        if op in repeatOps and av[0] >= 1:  # the body of a required repetition has to occur at least once
+            body = _flatten(av[2])
+            if body and all(o is LITERAL for o, a in body):
+                runs.append((-1, -1, "".join(chr(a) for o, a in body)))
+
+    anchoredStart = bool(items) and items[0][0] is AT and items[0][1] in startAnchors
+    anchoredEnd = bool(items) and items[-1][0] is AT and items[-1][1] in endAnchors
+    prefix = suffix = ""
+    literals = []
+    for start, end, text in runs:
+        if anchoredStart and start == 1:
+            prefix = text
+        elif anchoredEnd and start >= 0 and end == len(items) - 1:
+            suffix = text
+        else:
+            literals.append(text)
+    # longest literals first: they are the most likely to reject a word
+    literals = tuple(sorted(set(literals), key=len, reverse=True))
+    return prefix, suffix, literals, bulkSafe
+
+
+class GrepPattern(object):
+    """A compiled regular expression with a cheap prefilter.
+
+    Attributes:
+    regex (RE):         The compiled regular expression.
+    prefix (str):       Text every matching word starts with ("" if none).
+    suffix (str):       Text every matching word ends with ("" if none).
+    literals (tuple):   Substrings every matching word contains.
+    bulkSafe (Bool):    Signals whether the pattern can be run over the newline-joined list (see grepJoined).
+    """
+
+    def __init__(self, regex):
+        self.regex = regex
+        self.prefix, self.suffix, self.literals, self.bulkSafe = analyzePattern(regex)
+        self.hasPrefilter = bool(self.prefix or self.suffix or self.literals)
+        self._bulkRegex = None
+        self.matches = self._compileMatcher()
+
+    def _compileMatcher(self):
+        """Return a function checking whether the pattern matches a given word.
+
+        The most selective literal test runs inline before the regular expression search.
+        """
+        search = self.regex.search
+        if self.suffix:
+            suffix = self.suffix
+            return lambda word: word.endswith(suffix) and search(word) is not None
+        if self.prefix:
+            prefix = self.prefix
+            return lambda word: word.startswith(prefix) and search(word) is not None
+        if self.literals:
+            literal = self.literals[0]
+            return lambda word: literal in word and search(word) is not None
+        return lambda word: search(word) is not None
+
+    def prefilter(self, word):
+        """Check the literal requirements of the pattern; False means the word can't match."""
+        if not word.startswith(self.prefix) or not word.endswith(self.suffix):
+            return False
+        for literal in self.literals:
+            if literal not in word:
+                return False
+        return True
+
+    def bulkRegex(self):
+        """Return the pattern compiled for running over the newline-joined list."""
+        if self._bulkRegex is None:
+            self._bulkRegex = re.compile(self.regex.pattern, self.regex.flags | re.MULTILINE)
+        return self._bulkRegex
+
+
+class JoinedWords(object):
+    """A wordlist joined into one newline-separated string.
+
+    Attributes:
+    text (str):         The joined words, each followed by a newline.
+    starts (array):     Position of the first character of each word in text, plus len(text).
+    nbytes (int):       Approximate memory used.
+    """
+
+    def __init__(self, words):
+        self.text = "\n".join(words) + "\n" if len(words) else ""
+        starts = array("I", [0])
+        position = 0
+        for w in words:
+            position += len(w) + 1
+            starts.append(position)
+        self.starts = starts
+        self.nbytes = len(self.text) + 4 * len(starts)
+
+
+def grepJoined(joined, grep, idRange=None):
+    """Return the sorted IDs of the words in a JoinedWords that match a GrepPattern.
+
+    One regular expression search runs over the joined text and jumps to the next
+    word after every hit, instead of searching every word separately. Hits are
+    confirmed against the single word, since a match may run across a newline.
+    Only use this if grep.bulkSafe is true.
+    """
+    text, starts = joined.text, joined.starts
+    if idRange is None:
+        idRange = (0, len(starts) - 1)
+    first, last = idRange
+    if last <= first:
+        return []
+    search = grep.bulkRegex().search
+    wordSearch = grep.regex.search
+    endPos = starts[last]
+    pos = starts[first]
+    result = []
+    while pos < endPos:
+        m = search(text, pos, endPos)
+        if m is None:
+            break
+        i = bisect_right(starts, m.start(), first, last + 1) - 1
+        wordStart, wordEnd = starts[i], starts[i + 1] - 1
+        if m.end() <= wordEnd or wordSearch(text[wordStart:wordEnd]) is not None:
+            result.append(i)
+        pos = wordEnd + 1
+    return result
@@ -0,0 +1,300 @@
+# coding=utf-8
+"""
+Corpus import for word-o-mat.
+
+A CorpusImporter turns running text of any size (scraped pages, books, a
+dump of a whole wiki) into a compiled wordlist (see wordcache) that can be
+selected like the bundled dictionaries. The text is read in chunks of a fixed
+number of bytes, normalized to NFC and split into words; the distinct words
+and their counts are kept in a dict. When the dict holds maxWords words, it
+is written out as a sorted run file and emptied, and at the end the runs are
+merged into the compiled wordlist, at most maxRuns at a time so that only
+that many files are open at once. Memory use thus depends on chunkSize and
+maxWords, not on the size of the corpus.
+
+Run this module to import a corpus from the command line:
+    python wordimport.py corpus.txt "Custom/My corpus" [--min-count 2]
+"""
+from __future__ import print_function
+
+import argparse
+import codecs
+import heapq
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+import unicodedata
+from collections import Counter
+
+import wordcache
+
+importWritingSystem = "Custom"  # writing system of corpora imported in the plugin window
+wordEdges = u"'’-"  # kept inside words ("don’t", "well-known"), stripped at their ends
+# separators: white space, digits, and punctuation other than wordEdges
+separatorPattern = re.compile(u"[\\s\\d!\"#$%&()*+,./:;<=>?@\\[\\\\\\]^_`{|}~"
+                              u"\u00a1\u00ab\u00b7\u00bb\u00bf\u2010-\u2015\u2018\u201a-\u201f\u2022\u2026\u2039\u203a"
+                              u"\u060c\u061b\u061f\u06d4\u0964\u0965\u3001\u3002]+")
+
+
+def isWord(token):
+    """Check that a token only holds letters, combining marks and the apostrophes and hyphens of wordEdges."""
+    if token.isalpha():
+        return True
+    for c in token:
+        if c not in wordEdges and unicodedata.category(c)[0] not in "LM":
+            return False
+    return True
+
+
+def tokenize(text, maxLength=40):
+    """Return the words of a piece of running text, in order, with repetitions.
+
+    Symbols, emoji and other tokens that aren't words are dropped, and so are words longer than maxLength.
+    """
+    words = []
+    for token in separatorPattern.split(text):
+        token = token.strip(wordEdges)
+        if token and len(token) <= maxLength:
+            words.append(token)
+    return words
+
+
+def readRun(path):
+    """Yield the (word, count) items of a run file written by CorpusImporter.spill."""
+    with io.open(path, "r", encoding="utf-8", newline="\n") as fo:
+        for line in fo:
+            word, count = line.rstrip("\n").split("\t")
+            yield word, int(count)
+
+
+def runKey(item):
+    """Sort key of the (word, count) items of run files: by length, then alphabetically."""
+    return len(item[0]), item[0]
+
+
+def mergeRuns(sources):
+    """Yield the (word, count) items of sorted sources, adding up the counts of words found in several of them."""
+    last, total = None, 0
+    for word, count in heapq.merge(*sources, key=runKey):
+        if word != last:
+            if last is not None:
+                yield last, total
+            last, total = word, 0
+        total += count
+    if last is not None:
+        yield last, total
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+class CorpusImporter(object):
+    """Imports a UTF-8 text file into a compiled wordlist, in bounded memory.
+
+    Attributes:
+    sourcePath (str):   The text file.
+    destPath (str):     The compiled wordlist to write.
+    chunkSize (int):    Number of bytes read at a time.
+    maxWords (int):     Number of distinct words held in memory before they are written to a run file.
+    maxRuns (int):      Number of run files merged at a time; more runs are first merged into fewer, larger ones.
+    minCount (int):     Number of times a word must occur in the corpus to be kept.
+    maxLength (int):    Longest word kept, in characters.
+    totalBytes (int):   Size of the text file.
+    bytesRead (int):    Number of bytes read so far.
+    tokens (int):       Number of words read so far, with repetitions.
+    words (int):        Number of distinct words written to the wordlist, once done.
+    cancelled (Bool):   Set by cancel(); the import stops at the next chunk.
+    """
+
+    def __init__(self, sourcePath, destPath, chunkSize=1 << 20, maxWords=200000, minCount=1, maxLength=40,
+                 maxRuns=64):
+        self.sourcePath = sourcePath
+        self.destPath = destPath
+        self.chunkSize = chunkSize
+        self.maxWords = maxWords
+        self.maxRuns = maxRuns
+        self.minCount = minCount
+        self.maxLength = maxLength
+        self.totalBytes = os.path.getsize(sourcePath)
+        self.bytesRead = 0
+        self.tokens = 0
+        self.words = 0
+        self.cancelled = False
+        self._counts = {}  # word -> number of occurrences, since the last run was written
+        self._runs = []  # paths of the run files
+        self._runCount = 0  # number of run files written, for their names
+        self._tempFolder = None
+
+    def cancel(self):
+        """Stop the import; safe to call from another thread."""
+        self.cancelled = True
+
+    def chunks(self):
+        """Yield the text of the file in NFC, in pieces of about chunkSize bytes that end between words."""
+        decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        rest = u""
+        skipping = False  # whether the text starts inside a token too long to keep
+        with open(self.sourcePath, "rb") as fo:
+            while True:
+                if self.cancelled:
+                    raise ImportCancelled()
+                data = fo.read(self.chunkSize)
+                self.bytesRead += len(data)
+                text = rest + decoder.decode(data, final=not data)
+                if skipping:
+                    separator = separatorPattern.search(text)
+                    skipping = separator is None
+                    text = text[separator.start():] if separator is not None else u""
+                if not data:
+                    if text:
+                        yield unicodedata.normalize("NFC", text)
+                    return
+                # keep the word cut off at the end of the chunk for the next one: cut after the last
+                # separator, which may be punctuation or a digit as well as white space
+                cut = None
+                for separator in separatorPattern.finditer(text, max(len(text) - self.maxLength - 1, 0)):
+                    cut = separator.end()
+                if cut is None:
+                    if len(text) > self.maxLength:
+                        # the chunk ends in a token too long to keep; its rest in the next chunk is dropped
+                        cut = len(text)
+                        skipping = True
+                    else:
+                        cut = 0
+                rest = text[cut:]
+                yield unicodedata.normalize("NFC", text[:cut])
+
+    def add(self, words):
+        """Count a list of words, writing a run file whenever maxWords distinct words are held."""
+        counts = self._counts
+        for w, n in Counter(words).items():
+            count = counts.get(w)
+            if count is not None:
+                counts[w] = count + n
+            elif isWord(w):
+                counts[w] = n
+                if len(counts) >= self.maxWords:
+                    self.spill()
+                    counts = self._counts
+        self.tokens += len(words)
+
+    def spill(self):
+        """Write the words counted so far to a run file, sorted by length and then alphabetically, and forget them."""
+        self._runs.append(self.writeRun(sorted(self._counts.items(), key=runKey)))
+        self._counts = {}
+
+    def writeRun(self, items):
+        """Write sorted (word, count) items to a new run file and return its path."""
+        if self._tempFolder is None:
+            self._tempFolder = tempfile.mkdtemp(prefix="wordimport-", dir=os.path.dirname(self.destPath) or None)
+        self._runCount += 1
+        path = os.path.join(self._tempFolder, "run%d.txt" % self._runCount)
+        with io.open(path, "w", encoding="utf-8", newline="\n") as fo:
+            fo.writelines(u"%s\t%d\n" % item for item in items)
+        return path
+
+    def reduceRuns(self):
+        """Merge the oldest maxRuns run files into one until fewer than maxRuns are left."""
+        fanIn = max(self.maxRuns, 2)
+        while len(self._runs) >= fanIn:
+            if self.cancelled:
+                raise ImportCancelled()
+            group, self._runs = self._runs[:fanIn], self._runs[fanIn:]
+            self._runs.append(self.writeRun(mergeRuns([readRun(path) for path in group])))
+            for path in group:
+                os.remove(path)
+
+    def merged(self):
+        """Yield the distinct words of all runs and the words still in memory that occur at least minCount times,
+        sorted by length."""
+        self.reduceRuns()
+        sources = [readRun(path) for path in self._runs]
+        sources.append(sorted(self._counts.items(), key=runKey))
+        for word, count in mergeRuns(sources):
+            if count >= self.minCount:
+                yield word
+
+    def counted(self):
+        """Pass the words of merged through, counting them."""
+        for w in self.merged():
+            if self.cancelled:
+                raise ImportCancelled()
+            self.words += 1
+            yield w
+
+    def run(self, progress=None):
+        """Import the file and return the number of distinct words written.
+
+        progress, if given, is called with the importer after every chunk, and once more before the
+        runs are merged. Raises ImportCancelled if the import was cancelled; the destination is only
+        replaced once the new wordlist is complete.
+        """
+        folder = os.path.dirname(self.destPath)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        self._runs = []
+        self.words = 0
+        try:
+            for text in self.chunks():
+                self.add(tokenize(text, self.maxLength))
+                if progress is not None:
+                    progress(self)
+            if self.cancelled:
+                raise ImportCancelled()
+            wordcache.writeCompiledStream(self.counted(), self.destPath, wordcache.sourceStamp(self.sourcePath))
+        finally:
+            self._counts = {}
+            if self._tempFolder is not None:
+                shutil.rmtree(self._tempFolder, ignore_errors=True)
+                self._tempFolder = None
+        return self.words
+
+    def progressText(self):
+        """Return the progress as one short line, e.g. "Importing: 120 of 800 MB, 1,234,567 words read"."""
+        return "Importing: %s of %s MB, %s words read" % ("{:,}".format(self.bytesRead >> 20),
+                                                    "{:,}".format(self.totalBytes >> 20),
+                                                    "{:,}".format(self.tokens))
+
+
+def importPath(writingSystem, language, importFolder=None):
+    """Return the path of the compiled wordlist for an imported dictionary."""
+    if importFolder is None:
+        importFolder = wordcache.defaultImportFolder()
+    return os.path.join(importFolder, writingSystem, language + ".wordlist")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="wordimport", description="Import a text corpus as a word-o-mat dictionary.")
+    parser.add_argument("corpus", help="UTF-8 text file")
+    parser.add_argument("dictionary", help="dictionary to create, as 'Writing system/language', e.g. 'Custom/News'")
+    parser.add_argument("--folder", default=None, help="folder for imported dictionaries")
+    parser.add_argument("--min-count", type=int, default=1, dest="minCount", help="occurrences needed to keep a word")
+    parser.add_argument("--max-words", type=int, default=200000, dest="maxWords",
+                        help="distinct words held in memory before they are written to disk")
+    parser.add_argument("--max-runs", type=int, default=64, dest="maxRuns",
+                        help="temporary files merged at a time")
+    options = parser.parse_args(args)
+    if "/" not in options.dictionary:
+        print("wordimport: please give the dictionary as 'Writing system/language'", file=sys.stderr)
+        return 2
+    writingSystem, language = options.dictionary.split("/", 1)
+    importer = CorpusImporter(options.corpus, importPath(writingSystem, language, options.folder),
+                              maxWords=options.maxWords, minCount=options.minCount, maxRuns=options.maxRuns)
+
+    def progress(importer):
+        print("\r" + importer.progressText(), end="", file=sys.stderr)
+    try:
+        count = importer.run(progress)
+    except KeyboardInterrupt:
+        print("\nwordimport: cancelled", file=sys.stderr)
+        return 1
+    print("\nwordimport: %s words in %s" % ("{:,}".format(count), importer.destPath), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
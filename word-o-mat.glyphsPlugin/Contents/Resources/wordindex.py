@@ -0,0 +1,288 @@
+# coding=utf-8
+"""
+Per-wordlist indexes for word-o-mat.
+
+A CharIndex maps every character to a bitmap of the IDs (list positions) of the
+words containing it. Bitmaps are plain Python ints, so charset limits and
+required letters/groups are answered for the whole list at once with a few
+bitwise operations instead of scanning every word.
+
+An NGramIndex maps every character pair and triple to the sorted IDs of the
+words containing it, for "words containing this sequence" queries. Its
+posting lists are stored as variable-length encoded deltas in one bytes object
+each, which keeps it small enough to hold for every loaded language.
+"""
+from array import array
+
+
+def bitCount(bits):
+    """Return the number of set bits in a bitmap."""
+    try:
+        return bits.bit_count()
+    except AttributeError:  # Python < 3.10
+        return bin(bits).count("1")
+
+
+def bitIndices(bits):
+    """Return the positions of the set bits in a bitmap, in ascending order."""
+    result = []
+    s = bin(bits)[:1:-1]  # least significant bit first
+    i = s.find("1")
+    while i != -1:
+        result.append(i)
+        i = s.find("1", i + 1)
+    return result
+
+
+def postingsToBits(postings, size, buffer=None):
+    """Convert a list of word IDs into a bitmap over size words."""
+    if buffer is None:
+        buffer = bytearray(b"0" * size)
+    last = size - 1
+    for i in postings:
+        buffer[last - i] = 49  # "1"
+    bits = int(buffer, 2) if size else 0
+    for i in postings:
+        buffer[last - i] = 48  # back to "0" so the buffer can be reused
+    return bits
+
+
+class CharIndex(object):
+    """Character index over a wordlist.
+
+    Attributes:
+    size (int):         Number of words in the list.
+    allBits (int):      Bitmap with one bit set per word.
+    alphabet (dict):    Maps each character to its bit in the word signatures.
+    signatures (array): Per-word alphabet signature: bitmask of the characters used in each word.
+    repeating (int):    Bitmap of the words using a character more than once.
+    duplicates (int):   Bitmap of the words that occur earlier in the list already.
+    nbytes (int):       Approximate memory used by the index.
+    """
+
+    def __init__(self, words):
+        self.size = len(words)
+        self.allBits = (1 << self.size) - 1
+        self.alphabet = {}
+        postings = {}
+        signatures = []
+        repeating = array("I")
+        duplicates = array("I")
+        seen = set()
+        alphabet = self.alphabet
+        for i, w in enumerate(words):
+            if w in seen:
+                duplicates.append(i)
+            else:
+                seen.add(w)
+            chars = set(w)
+            if len(chars) != len(w):
+                repeating.append(i)
+            signature = 0
+            for c in chars:
+                bit = alphabet.get(c)
+                if bit is None:
+                    bit = alphabet[c] = 1 << len(alphabet)
+                    postings[c] = array("I")
+                postings[c].append(i)
+                signature |= bit
+            signatures.append(signature)
+        typecode = "Q" if len(alphabet) <= 64 else None
+        self.signatures = array(typecode, signatures) if typecode else signatures
+        buffer = bytearray(b"0" * self.size)
+        self._bits = {c: postingsToBits(p, self.size, buffer) for c, p in postings.items()}
+        self.repeating = postingsToBits(repeating, self.size, buffer)
+        self.duplicates = postingsToBits(duplicates, self.size, buffer)
+        self.nbytes = sum(b.bit_length() // 8 for b in self._bits.values()) + 8 * self.size + self.size // 4
+
+    def containing(self, c):
+        """Return the bitmap of words containing the character c."""
+        return self._bits.get(c, 0)
+
+    def containingAny(self, chars):
+        """Return the bitmap of words containing at least one of chars."""
+        bits = 0
+        for c in chars:
+            bits |= self._bits.get(c, 0)
+        return bits
+
+    def containingAll(self, chars):
+        """Return the bitmap of words containing every one of chars."""
+        bits = self.allBits
+        for c in sorted(set(chars), key=lambda c: self._bits.get(c, 0).bit_length()):
+            bits &= self._bits.get(c, 0)
+            if not bits:
+                break
+        return bits
+
+    def excluding(self, chars):
+        """Return the bitmap of words containing none of chars."""
+        return self.allBits & ~self.containingAny(chars)
+
+    def limitedTo(self, charset):
+        """Return the bitmap of words using only characters from charset."""
+        charset = frozenset(charset)
+        return self.excluding(c for c in self._bits if c not in charset)
+
+    def containingGroups(self, groups):
+        """Return the bitmap of words containing at least one member of every non-empty group."""
+        bits = self.allBits
+        for group in groups:
+            if len(group):
+                bits &= self.containingAny(group)
+        return bits
+
+    def charsetMask(self, charset):
+        """Return the signature mask of the characters of charset that occur in the list."""
+        mask = 0
+        for c in charset:
+            mask |= self.alphabet.get(c, 0)
+        return mask
+
+    def usesOnly(self, wordID, mask):
+        """Check a single word against a charset mask (see charsetMask)."""
+        return not self.signatures[wordID] & ~mask
+
+
+def encodePostings(ids):
+    """Encode a sorted list of IDs as deltas of 7 bits per byte, the high bit marking a continued delta."""
+    deltas = [b - a for a, b in zip([0] + list(ids[:-1]), ids)] if len(ids) else []
+    if not deltas or max(deltas) < 0x80:
+        return bytes(deltas)
+    data = bytearray()
+    for delta in deltas:
+        while delta >= 0x80:
+            data.append(delta & 0x7F | 0x80)
+            delta >>= 7
+        data.append(delta)
+    return bytes(data)
+
+
+def iterPostings(data):
+    """Yield the IDs of an encoded posting list (see encodePostings), in ascending order."""
+    value = 0
+    shift = 0
+    last = 0
+    for byte in data:
+        if byte & 0x80:
+            value |= (byte & 0x7F) << shift
+            shift += 7
+        else:
+            last += value | byte << shift
+            value = shift = 0
+            yield last
+
+
+class NGramIndex(object):
+    """Inverted index of the character sequences of length 2 and 3 of a wordlist.
+
+    Attributes:
+    size (int):         Number of words in the list.
+    lengths (tuple):    Sequence lengths indexed.
+    nbytes (int):       Memory used by the encoded posting lists.
+    """
+
+    def __init__(self, words, lengths=(2, 3)):
+        self.size = len(words)
+        self.lengths = tuple(lengths)
+        postings = {}  # n-gram -> IDs of the words containing it
+        getPostings = postings.get
+        for i, w in enumerate(words):
+            grams = set()
+            for n in self.lengths:
+                grams.update([w[j:j + n] for j in range(len(w) - n + 1)])
+            for gram in grams:
+                ids = getPostings(gram)
+                if ids is None:
+                    ids = postings[gram] = array("I")
+                ids.append(i)
+        self._postings = {gram: encodePostings(ids) for gram, ids in postings.items()}
+        self.nbytes = sum(len(gram) * 4 + len(data) for gram, data in self._postings.items())
+
+    def postings(self, gram):
+        """Return the sorted IDs of the words containing an indexed sequence."""
+        return list(iterPostings(self._postings.get(gram, b"")))
+
+    def _grams(self, sequence):
+        """Return the indexed sequences that every word containing sequence must contain."""
+        n = max(k for k in self.lengths if k <= len(sequence))
+        return set(sequence[j:j + n] for j in range(len(sequence) - n + 1))
+
+    def candidates(self, sequences):
+        """Return the sorted IDs of the words containing all indexed parts of all sequences.
+
+        The posting lists are intersected shortest first, and each one is only decoded
+        up to the last ID still in the result. Sequences shorter than the shortest
+        indexed length are ignored.
+        """
+        grams = set()
+        for sequence in sequences:
+            if len(sequence) >= self.lengths[0]:
+                grams.update(self._grams(sequence))
+        if not grams:
+            return list(range(self.size))
+        lists = sorted((self._postings.get(gram, b"") for gram in grams), key=len)
+        result = list(iterPostings(lists[0]))
+        for data in lists[1:]:
+            if not result:
+                break
+            keep = set(result)
+            last = result[-1]
+            found = []
+            for i in iterPostings(data):
+                if i > last:
+                    break
+                if i in keep:
+                    found.append(i)
+            result = found
+        return result
+
+    def containingAll(self, sequences, words):
+        """Return the sorted IDs of the words of the list containing every one of sequences.
+
+        Sequences of an indexed length are answered from the index alone; the candidates
+        for shorter or longer ones are checked against words.
+        """
+        result = self.candidates(sequences)
+        unindexed = [s for s in sequences if len(s) not in self.lengths]
+        if unindexed:
+            result = [i for i in result if all(s in words[i] for s in unindexed)]
+        return result
+
+
+def rangeBits(start, stop):
+    """Return a bitmap with the bits start to stop - 1 set."""
+    if stop <= start:
+        return 0
+    return ((1 << (stop - start)) - 1) << start
+
+
+def matchingBits(index, limitToCharset=None, requiredLetters=(), requiredGroups=(), bannedLetters=(" ",), idRange=None,
+                 banRepetitions=False, unique=False):
+    """Return the bitmap of the words in an indexed list that pass the character requirements.
+
+    limitToCharset is an iterable of permitted characters, or None for no limit.
+    idRange optionally limits the result to a (start, stop) range of IDs, e.g. a range of word lengths.
+    banRepetitions drops words using a character twice; unique drops repeated entries of the same word.
+    """
+    bits = index.containingAll(requiredLetters) if requiredLetters else index.allBits
+    if idRange is not None:
+        bits &= rangeBits(*idRange)
+    if bits and requiredGroups:
+        bits &= index.containingGroups(requiredGroups)
+    if bits and bannedLetters:
+        bits &= ~index.containingAny(bannedLetters)
+    if bits and limitToCharset is not None:
+        bits &= index.limitedTo(limitToCharset)
+    if bits and banRepetitions:
+        bits &= ~index.repeating
+    if bits and unique:
+        bits &= ~index.duplicates
+    return bits
+
+
+def matchingIDs(index, limitToCharset=None, requiredLetters=(), requiredGroups=(), bannedLetters=(" ",), idRange=None,
+                banRepetitions=False, unique=False):
+    """Return the sorted IDs of the words in an indexed list that pass the character requirements (see matchingBits)."""
+    return bitIndices(matchingBits(index, limitToCharset, requiredLetters, requiredGroups, bannedLetters, idRange,
+                                   banRepetitions, unique))
@@ -0,0 +1,123 @@
+# coding=utf-8
+"""
+Line fitting for word-o-mat.
+
+A LineFitter makes lines of words that add up to a target width, for spacing
+and justification proofs. A line of n words is n word widths plus n - 1
+spaces wide, so adding one space to every word and to the target turns this
+into a subset-sum problem, solved with a bitset: bit s of a Python integer is
+set if some words add up to s. Words are grouped by width first, so the
+work depends on the number of distinct widths, not on the number of words,
+and a line is found as soon as any sum inside the tolerance is reachable.
+"""
+import random
+
+import wordsample
+
+
+def bitPositions(bits):
+    """Return the positions of the set bits of a non-negative integer, lowest first."""
+    digits = bin(bits)[:1:-1]  # lowest bit first
+    positions = []
+    position = digits.find("1")
+    while position != -1:
+        positions.append(position)
+        position = digits.find("1", position + 1)
+    return positions
+
+
+class LineFitter(object):
+    """Lines of words of a given width, without repeating words.
+
+    Attributes:
+    spaceWidth (int):   Width of the space between words.
+    remaining (int):    Number of words not used in a line yet.
+    """
+
+    def __init__(self, words, widths, spaceWidth):
+        """words and widths are sequences of the same length; words can be anything, e.g. word IDs.
+
+        Words with a width of 0 or less are left out.
+        """
+        self.spaceWidth = int(round(spaceWidth))
+        self._buckets = {}  # width -> words not used yet
+        for w, width in zip(words, widths):
+            width = int(width + 0.5)
+            if width > 0:
+                self._buckets.setdefault(width, []).append(w)
+        self._widths = sorted(self._buckets)
+        self.remaining = sum(len(bucket) for bucket in self._buckets.values())
+
+    def _items(self, limit, rng):
+        """Yield (width with space, word width, number of words) items covering every bucket, widths in random order.
+
+        A bucket of c words of one width becomes items of 1, 2, 4, ... words (binary splitting), so any
+        number of words up to c can be taken, but no more than fit in limit.
+        """
+        step = self.spaceWidth
+        for width in wordsample.shuffled(self._widths, rng):
+            if width + step <= 0:
+                continue
+            count = min(len(self._buckets[width]), limit // (width + step))
+            size = 1
+            while count > 0:
+                k = min(size, count)
+                yield (width + step) * k, width, k
+                count -= k
+                size *= 2
+
+    def fitLine(self, width, tolerance=0, rng=random):
+        """Return a list of words, separated by spaces as wide as width +/- tolerance, or None if there is none.
+
+        The words are taken out of the fitter, so later lines don't repeat them.
+        """
+        # n words plus n - 1 spaces is n times (word + space), minus one space
+        low = max(int(round(width - tolerance)) + self.spaceWidth, 1)
+        high = int(round(width + tolerance)) + self.spaceWidth
+        if high < low:
+            return None
+        items = []
+        mask = (1 << (high + 1)) - 1
+        reachable = 1
+        parent = {}  # sum -> index of the item that first reached it
+        for item in self._items(high, rng):
+            index = len(items)
+            items.append(item)
+            extended = (reachable | (reachable << item[0])) & mask
+            added = extended ^ reachable
+            if not added:
+                continue
+            for s in bitPositions(added):
+                parent[s] = index
+            reachable = extended
+            if reachable >> low:
+                break
+        hits = bitPositions(reachable >> low)
+        if not hits:
+            return None
+        # the reachable sum closest to the target
+        target = int(round(width)) + self.spaceWidth
+        total = min((low + h for h in hits), key=lambda s: abs(s - target))
+
+        # every sum was first reached from a smaller one using an earlier item, so following
+        # the parents back to 0 uses every item at most once
+        line = []
+        while total:
+            weight, wordWidth, count = items[parent[total]]
+            bucket = self._buckets[wordWidth]
+            for i in range(count):
+                line.append(bucket.pop(rng.randrange(len(bucket))))
+            total -= weight
+        self.remaining -= len(line)
+        rng.shuffle(line)
+        return line
+
+    def fitLines(self, width, count, tolerance=0, rng=random):
+        """Return up to count lines (see fitLine); fewer if the words run out."""
+        lines = []
+        while len(lines) < count:
+            line = self.fitLine(width, tolerance, rng)
+            if line is None:
+                break
+            lines.append(line)
+        return lines
@@ -0,0 +1,279 @@
+# coding=utf-8
+"""
+Font data caches for word-o-mat.
+
+The character set of a font, and the advance widths and kerning of a font
+master, are read from the font once, in bulk, and kept in plain Python
+containers, so generating and measuring words doesn't need any calls across
+the Objective-C bridge. The caches are keyed by font (and master) and are
+invalidated or patched from the font observers of the word-o-mat window.
+
+The functions reading a font take an optional wordstats.RunStats object,
+which counts the calls they make into the font objects.
+"""
+noKerning = 100000  # kerning values at or above this mean "no kerning" in Glyphs
+
+
+class FontMetrics(object):
+    """Advance widths and kerning of one font master.
+
+    Attributes:
+    advances (dict):    Maps character -> advance width.
+    kerningKeys (dict): Maps character -> (glyph key, left-side group key, right-side group key);
+                        the glyph key is used for exceptions, the group keys for class kerning.
+    kerning (dict):     Maps (left key, right key) -> kerning value.
+    """
+
+    def __init__(self, advances, kerningKeys=None, kerning=None):
+        self.advances = advances
+        self.kerningKeys = kerningKeys or {}
+        self.kerning = kerning or {}
+        self.pairs = {}  # (left char, right char) -> kerning, filled as pairs are looked up
+
+    def advance(self, char):
+        """Return the advance width of a character (0 if the font doesn't have it)."""
+        return self.advances.get(char, 0)
+
+    def kern(self, left, right):
+        """Return the kerning between two characters, with exceptions taking precedence over groups."""
+        pair = (left, right)
+        value = self.pairs.get(pair)
+        if value is None:
+            value = 0
+            leftKeys = self.kerningKeys.get(left)
+            rightKeys = self.kerningKeys.get(right)
+            if leftKeys is not None and rightKeys is not None and self.kerning:
+                kerning = self.kerning
+                for key in ((leftKeys[0], rightKeys[0]), (leftKeys[0], rightKeys[2]),
+                            (leftKeys[1], rightKeys[0]), (leftKeys[1], rightKeys[2])):
+                    if key in kerning:
+                        value = kerning[key]
+                        break
+            self.pairs[pair] = value
+        return value
+
+    def wordWidth(self, word):
+        """Return the width of a word: advance widths plus kerning."""
+        advances = self.advances
+        width = 0
+        for char in word:
+            width += advances.get(char, 0)
+        kern = self.kern
+        for i in range(len(word) - 1):
+            width += kern(word[i], word[i + 1])
+        return width
+
+    def sortByWidth(self, words):
+        """Return the words sorted by width (and alphabetically for equal widths)."""
+        return [w for width, w in sorted((self.wordWidth(w), w) for w in words)]
+
+
+def masterID(font):
+    """Return the ID of the master used for measuring: the selected one, or the first."""
+    master = getattr(font, "selectedFontMaster", None)
+    if master is None:
+        master = font.masters[0]
+    return master.id
+
+
+def readFontMetrics(font, masterId, stats=None):
+    """Read the advance widths and kerning of a GSFont master into a FontMetrics object."""
+    advances = {}
+    kerningKeys = {}
+    calls = 1  # glyphs
+    for g in font.glyphs:
+        calls += 1
+        if g.unicode is None:
+            continue
+        calls += 8  # character, layer, width, both kerning groups (read twice each) and ID
+        try:
+            char = g.charString()
+        except ValueError:
+            continue
+        layer = g.layers[masterId]
+        advances[char] = layer.width if layer is not None else 0
+        leftGroup = "@MMK_L_" + g.rightKerningGroup if g.rightKerningGroup else None
+        rightGroup = "@MMK_R_" + g.leftKerningGroup if g.leftKerningGroup else None
+        kerningKeys[char] = (g.id, leftGroup, rightGroup)
+
+    kerning = readKerning(font, masterId, stats)
+    if stats is not None:
+        stats.bridgeCalls += calls
+    return FontMetrics(advances, kerningKeys, kerning)
+
+
+def readKerning(font, masterId, stats=None):
+    """Read the kerning of a GSFont master into a dict mapping (left key, right key) -> value."""
+    kerning = {}
+    try:
+        masterKerning = font.kerning[masterId]
+    except (KeyError, TypeError):
+        masterKerning = None
+    if masterKerning:
+        for leftKey, rightValues in masterKerning.items():
+            for rightKey, value in rightValues.items():
+                if value < noKerning:
+                    kerning[(str(leftKey), str(rightKey))] = value
+    if stats is not None:
+        stats.bridgeCalls += 1
+    return kerning
+
+
+_metricsCache = {}  # id(font) -> (font, masterId, FontMetrics)
+
+
+def fontMetrics(font, masterId=None, stats=None):
+    """Return the (cached) FontMetrics of a font master, reading it from the font if needed.
+
+    Kerning edits don't change any glyph, so the kerning of a cached master is read again and
+    compared; if it differs, the cached advances are kept and only the kerning is replaced.
+    """
+    if masterId is None:
+        masterId = masterID(font)
+        if stats is not None:
+            stats.bridgeCalls += 2
+    entry = _metricsCache.get(id(font))
+    if entry is not None and entry[0] is font and entry[1] == masterId:
+        metrics = entry[2]
+        kerning = readKerning(font, masterId, stats)
+        if kerning == metrics.kerning:
+            return metrics
+        metrics = FontMetrics(metrics.advances, metrics.kerningKeys, kerning)
+    else:
+        metrics = readFontMetrics(font, masterId, stats)
+    _metricsCache[id(font)] = (font, masterId, metrics)
+    return metrics
+
+
+def invalidateMetrics(font=None):
+    """Drop the cached metrics of a font, or of all fonts."""
+    if font is None:
+        _metricsCache.clear()
+    else:
+        _metricsCache.pop(id(font), None)
+
+
+class FontCharset(object):
+    """The characters available in a font.
+
+    Attributes:
+    chars (frozenset):  Characters of all glyphs with a Unicode value.
+    glyphNames (dict):  Maps character -> glyph name.
+    glyphCount (int):   Number of glyphs in the font when the charset was read.
+    """
+
+    def __init__(self, glyphCount=0):
+        self.glyphCount = glyphCount
+        self.glyphNames = {}
+        self._charsByGlyph = {}  # glyph name -> character
+        self.chars = frozenset()
+
+    def setGlyph(self, name, char):
+        """Record the character of a glyph (None if it has no Unicode value)."""
+        old = self._charsByGlyph.pop(name, None)
+        if old is not None and self.glyphNames.get(old) == name:
+            del self.glyphNames[old]
+        if char is not None:
+            self._charsByGlyph[name] = char
+            self.glyphNames[char] = name
+
+    def update(self):
+        """Rebuild the chars frozenset after glyphs were set or removed."""
+        self.chars = frozenset(self.glyphNames)
+
+
+def glyphCharacter(glyph):
+    """Return the character of a GSGlyph, or None if it has no Unicode value."""
+    if glyph.unicode is None:
+        return None
+    try:
+        return glyph.charString()
+    except ValueError:
+        return None
+
+
+def readFontCharset(font, stats=None):
+    """Read the characters of all glyphs of a GSFont into a FontCharset object."""
+    glyphs = font.glyphs
+    charset = FontCharset(len(glyphs))
+    for g in glyphs:
+        charset.setGlyph(g.name, glyphCharacter(g))
+    charset.update()
+    if stats is not None:
+        stats.bridgeCalls += 2 + 4 * charset.glyphCount  # glyphs, and each glyph with its name, unicode and character
+    return charset
+
+
+_charsetCache = {}  # id(font) -> (font, FontCharset)
+
+
+def fontCharset(font, stats=None):
+    """Return the (cached) FontCharset of a font.
+
+    The charset is read again if the number of glyphs in the font has changed;
+    other changes are applied through updateGlyphs or invalidateCharset.
+    """
+    entry = _charsetCache.get(id(font))
+    if stats is not None:
+        stats.bridgeCalls += 2
+    if entry is not None and entry[0] is font and entry[1].glyphCount == len(font.glyphs):
+        return entry[1]
+    charset = readFontCharset(font, stats)
+    _charsetCache[id(font)] = (font, charset)
+    return charset
+
+
+def updateGlyphs(font, glyphs):
+    """Patch the cached charset of a font for a few changed glyphs."""
+    entry = _charsetCache.get(id(font))
+    if entry is None or entry[0] is not font:
+        return
+    charset = entry[1]
+    for g in glyphs:
+        charset.setGlyph(g.name, glyphCharacter(g))
+    charset.update()
+
+
+def invalidateCharset(font=None):
+    """Drop the cached charset of a font, or of all fonts."""
+    if font is None:
+        _charsetCache.clear()
+    else:
+        _charsetCache.pop(id(font), None)
+
+
+_glyphStamps = {}  # id(font) -> (font, {glyph name: stamp})
+
+
+def glyphStamp(glyph):
+    """Return what decides a glyph's character and metrics: its Unicode value, kerning groups and last change date."""
+    return glyph.unicode, glyph.leftKerningGroup, glyph.rightKerningGroup, str(getattr(glyph, "lastChange", None))
+
+
+def changedGlyphs(font, glyphs):
+    """Return the glyphs whose stamp differs from when they were last passed in.
+
+    The interface observer fires on every redraw, so this is what tells real edits apart. Glyphs seen
+    for the first time are only recorded: they are stamped as soon as they are selected, before any edit.
+    Kerning changes are picked up by fontMetrics itself.
+    """
+    entry = _glyphStamps.get(id(font))
+    if entry is None or entry[0] is not font:
+        entry = _glyphStamps[id(font)] = (font, {})
+    stamps = entry[1]
+    changed = []
+    for g in glyphs:
+        stamp = glyphStamp(g)
+        old = stamps.get(g.name)
+        if old is not None and old != stamp:
+            changed.append(g)
+        stamps[g.name] = stamp
+    return changed
+
+
+def forgetGlyphStamps(font=None):
+    """Drop the recorded glyph stamps of a font, or of all fonts."""
+    if font is None:
+        _glyphStamps.clear()
+    else:
+        _glyphStamps.pop(id(font), None)
@@ -0,0 +1,144 @@
+# coding=utf-8
+"""
+Live match preview for word-o-mat.
+
+While the settings are being edited, MatchPreview answers "how many words
+match, and what do they look like?" from the dictionary indexes. The match
+set is the intersection of a few component bitmaps (see wordindex): the
+charset, the required letters, each required group, the required sequences,
+the length range and the grep hits. Components are cached under the settings
+they depend on, so an edit only recomputes the component it touches: adding a
+required letter narrows the bitmap of the letters before, and changing a
+length limit only swaps the mask of length buckets.
+"""
+import random
+import threading
+from collections import OrderedDict
+
+import worddicts
+import wordengine
+import wordgrep
+import wordindex
+
+
+class MatchPreview(object):
+    """Exact match counts and a few sample words for queries that change a little at a time.
+
+    Attributes:
+    engine (WordEngine):    The engine whose dictionaries and indexes are used.
+    sampleCount (int):      Number of sample words returned with each count.
+    maxComponents (int):    Number of component bitmaps kept.
+
+    Queries run on one thread at a time, but clear may be called from another one; the cache is guarded by a lock.
+    """
+
+    def __init__(self, engine, sampleCount=3, maxComponents=64):
+        self.engine = engine
+        self.sampleCount = sampleCount
+        self.maxComponents = maxComponents
+        self._components = OrderedDict()  # (kind, dictionary key, settings) -> bitmap
+        self._indexes = {}  # dictionary key -> the index its components were built from
+        self._required = None  # (dictionary key, letters, bitmap) of the last query
+        self._lock = threading.Lock()
+
+    def _component(self, key, build):
+        """Return a cached component bitmap, building it with build() if needed."""
+        with self._lock:
+            bits = self._components.get(key)
+            if bits is not None:
+                self._components.move_to_end(key)
+                return bits
+        bits = build()
+        with self._lock:
+            self._components[key] = bits
+            while len(self._components) > self.maxComponents:
+                self._components.popitem(last=False)
+            if len(self._indexes) > 1:
+                used = set(k[1] for k in self._components)
+                for dictionaryKey in list(self._indexes):
+                    if dictionaryKey not in used:
+                        del self._indexes[dictionaryKey]
+        return bits
+
+    def _dictionaryKey(self, query, index):
+        """Return the key of the query's dictionary, dropping its components if they were built from another index.
+
+        The index is referenced while components built from it are cached, so a reloaded wordlist is always noticed.
+        """
+        dictionaryKey = (query.writingSystem, query.language, query.case)
+        with self._lock:
+            if self._indexes.get(dictionaryKey) is not index:
+                for key in [k for k in self._components if k[1] == dictionaryKey]:
+                    del self._components[key]
+                if self._required is not None and self._required[0] == dictionaryKey:
+                    self._required = None
+                self._indexes[dictionaryKey] = index
+        return dictionaryKey
+
+    def _requiredBits(self, dictionaryKey, index, letters):
+        """Return the bitmap of words containing all letters, narrowing the previous result if possible."""
+        letters = frozenset(letters)
+        with self._lock:
+            last = self._required
+        if last is not None and last[0] == dictionaryKey and last[1] <= letters:
+            bits = last[2]
+            if letters != last[1]:
+                bits &= index.containingAll(letters - last[1])
+        else:
+            bits = index.containingAll(letters)
+        with self._lock:
+            self._required = (dictionaryKey, letters, bits)
+        return bits
+
+    def matchingBits(self, query):
+        """Return the bitmap of the words matching the query, or None if it can't be answered from the indexes.
+
+        That is the case for grep patterns that can't be searched over the joined list.
+        """
+        textMode = query.matchMode == "text"
+        if not textMode:
+            grep = wordgrep.compilePattern(query.matchPattern)
+            if not grep.bulkSafe:
+                return None
+        engine = self.engine
+        words = engine.words(query)
+        index = engine.charIndex(query.writingSystem, query.language, query.case)
+        dictionaryKey = self._dictionaryKey(query, index)
+
+        bits = self._component(("base", dictionaryKey, query.charset, query.banRepetitions),
+                               lambda: wordindex.matchingBits(index, query.charset,
+                                                              banRepetitions=query.banRepetitions, unique=True))
+        bits &= wordindex.rangeBits(*worddicts.lengthRange(words, query.minLength, query.maxLength))
+        if textMode:
+            if bits and query.requiredLetters:
+                bits &= self._requiredBits(dictionaryKey, index, query.requiredLetters)
+            for group in query.requiredGroups:
+                if bits and len(group):
+                    bits &= self._component(("group", dictionaryKey, frozenset(group)),
+                                            lambda: index.containingAny(group))
+            if bits and query.requiredSequences:
+                bits &= self._component(("sequences", dictionaryKey, frozenset(query.requiredSequences)),
+                                        lambda: engine.sequenceBits(query))
+        elif bits:
+            joined = engine.joinedWords(query.writingSystem, query.language, query.case)
+            bits &= self._component(("grep", dictionaryKey, query.matchPattern),
+                                    lambda: wordindex.postingsToBits(wordgrep.grepJoined(joined, grep), index.size))
+        return bits
+
+    def update(self, query, rng=random):
+        """Return (number of matching words, a few random matching words) for a query."""
+        words = self.engine.words(query)
+        bits = self.matchingBits(query)
+        if bits is None:
+            ids = self.engine.matchingIDs(query)
+        else:
+            ids = wordindex.bitIndices(bits)
+        sample = rng.sample(ids, min(self.sampleCount, len(ids)))
+        return len(ids), [wordengine.finishCase(words[i], query.case, rng) for i in sample]
+
+    def clear(self):
+        """Drop all cached components, e.g. when the dictionaries were reloaded; safe to call from another thread."""
+        with self._lock:
+            self._components.clear()
+            self._indexes.clear()
+            self._required = None
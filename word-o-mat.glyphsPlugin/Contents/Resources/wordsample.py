@@ -0,0 +1,118 @@
+# coding=utf-8
+"""
+Random sampling without replacement for word-o-mat.
+
+Words are drawn from a list in a lazily shuffled order: every word is visited
+at most once, and only the part of the permutation that is actually consumed
+is ever computed. Seeds can be split into independent child seeds by key
+(deriveSeed), and a Permutation gives random access into a seeded order, so
+e.g. the words of page 10 can be found without drawing pages 0 to 9 first.
+"""
+import hashlib
+import random
+
+
+def deriveSeed(seed, *keys):
+    """Return a 64-bit seed derived from a seed and some keys, e.g. the ID of a batch job.
+
+    The result only depends on the values, not on the process or the order of the calls,
+    so jobs seeded this way give the same words however they are distributed across workers.
+    """
+    text = "\x1f".join([repr(seed)] + [repr(k) for k in keys])
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+def shuffledIndices(n, rng=random):
+    """Yield the numbers 0..n-1 in random order.
+
+    This is a Fisher-Yates shuffle over a virtual index array: only the swapped
+    positions are stored, so drawing k indices costs O(k) time and memory.
+    """
+    swapped = {}
+    for i in range(n):
+        j = rng.randrange(i, n)
+        value = swapped.get(j, j)
+        current = swapped.pop(i, i)
+        if j != i:
+            swapped[j] = current
+        yield value
+
+
+def shuffled(words, rng=random):
+    """Yield the items of a sequence in random order, without repetition."""
+    for i in shuffledIndices(len(words), rng):
+        yield words[i]
+
+
+def sampleMatching(words, accept, count, rng=random):
+    """Return up to count items of words for which accept(word) is true, in random order.
+
+    Stops as soon as count matches are found or the list is exhausted.
+    """
+    found = []
+    if count <= 0:
+        return found
+    for w in shuffled(words, rng):
+        if accept(w):
+            found.append(w)
+            if len(found) >= count:
+                break
+    return found
+
+
+mask64 = (1 << 64) - 1
+
+
+def _mix64(x):
+    """Scramble the bits of a 64-bit integer (the splitmix64 finalizer)."""
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & mask64
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & mask64
+    return x ^ (x >> 31)
+
+
+class Permutation(object):
+    """A seeded random permutation of range(n) with random access.
+
+    Positions are mapped through a small Feistel network over the next even power of two
+    and walked until they fall into range(n), so permutation[k] costs O(1) on average and
+    no table is built.
+
+    Attributes:
+    n (int):        Length of the permutation.
+    seed (int):     The seed; the same seed gives the same permutation on every machine.
+    """
+
+    def __init__(self, n, seed, rounds=4):
+        self.n = n
+        self.seed = seed
+        bits = max(2, (n - 1).bit_length())
+        self._halfBits = (bits + 1) // 2
+        self._halfMask = (1 << self._halfBits) - 1
+        self._keys = [deriveSeed(seed, "round", r) for r in range(rounds)]
+
+    def __len__(self):
+        return self.n
+
+    def _encrypt(self, value):
+        halfBits, halfMask = self._halfBits, self._halfMask
+        left, right = value >> halfBits, value & halfMask
+        for key in self._keys:
+            left, right = right, left ^ (_mix64(right ^ key) & halfMask)
+        return (left << halfBits) | right
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.n:
+            raise IndexError("permutation index out of range")
+        value = self._encrypt(position)
+        while value >= self.n:
+            value = self._encrypt(value)
+        return value
+
+    def __iter__(self):
+        for position in range(self.n):
+            yield self[position]
+
+    def page(self, number, size):
+        """Return the values at positions number * size to (number + 1) * size."""
+        start = number * size
+        return [self[k] for k in range(start, min(start + size, self.n))]
@@ -0,0 +1,90 @@
+# coding=utf-8
+"""
+Run instrumentation for word-o-mat.
+
+A RunStats object collects where the time of one generation run went
+(reading the font, resolving glyph names, sampling, checking, sorting by
+width, output) and what happened to the sampled words: how many were drawn,
+and which check rejected the others. The rejection counts per predicate show
+which filter does the most work, and so which one is worth indexing.
+
+Instrumentation is off unless a RunStats object is passed in; the
+uninstrumented code paths don't pay for it.
+"""
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+
+class RunStats(object):
+    """Timings and counters of one generation run.
+
+    In the plugin, output runs on the main thread while the next words are made in the background,
+    so the phase times can add up to more than the wall time of the run.
+
+    Attributes:
+    phases (OrderedDict):   Maps phase name -> wall time in seconds, in the order the phases first ran.
+    sampled (int):          Number of candidate words drawn from the dictionary.
+    accepted (int):         Number of words that passed all checks.
+    rejected (dict):        Maps predicate name -> number of words it rejected (see wordChecker.rejection).
+    bridgeCalls (int):      Number of calls into font objects across the Objective-C bridge.
+    predicateOrder (list):  Names of the checker predicates in the order they ended up in (see wordChecker.reorder).
+    """
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.sampled = 0
+        self.accepted = 0
+        self.rejected = {}
+        self.bridgeCalls = 0
+        self.predicateOrder = []
+
+    def addTime(self, name, seconds):
+        """Add seconds to the time of a phase."""
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        """Time the body of a with statement as (part of) a phase."""
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.addTime(name, time.perf_counter() - start)
+
+    def reject(self, name):
+        """Count a word rejected by the predicate name."""
+        self.rejected[name] = self.rejected.get(name, 0) + 1
+
+    def totalTime(self):
+        return sum(self.phases.values())
+
+    def toDict(self):
+        """Return the stats as a dict of plain values, e.g. for JSON."""
+        return {
+            "phases": OrderedDict((name, round(seconds * 1000, 3)) for name, seconds in self.phases.items()),
+            "totalMS": round(self.totalTime() * 1000, 3),
+            "sampled": self.sampled,
+            "accepted": self.accepted,
+            "rejected": dict(self.rejected),
+            "bridgeCalls": self.bridgeCalls,
+            "predicateOrder": list(self.predicateOrder),
+        }
+
+    def summary(self):
+        """Return the stats as one line, e.g.
+        "212.4 ms: sample 80.1, check 95.3 | 9,311 sampled, 20 words | rejected: charset 9,120, length 171 | order: charset > length | 3 bridge calls"
+        """
+        phases = ", ".join("%s %.1f" % (name, seconds * 1000) for name, seconds in self.phases.items())
+        rejected = ", ".join("%s %s" % (name, "{:,}".format(count))
+                             for name, count in sorted(self.rejected.items(), key=lambda item: -item[1]))
+        return "%.1f ms: %s | %s sampled, %s words | rejected: %s | order: %s | %s bridge calls" % (
+            self.totalTime() * 1000, phases or "-", "{:,}".format(self.sampled), "{:,}".format(self.accepted),
+            rejected or "-", " > ".join(self.predicateOrder) or "-", "{:,}".format(self.bridgeCalls))
+
+
+def timed(stats, name):
+    """Return stats.phase(name), or a context that does nothing if stats is None."""
+    if stats is None:
+        return nullcontext()
+    return stats.phase(name)
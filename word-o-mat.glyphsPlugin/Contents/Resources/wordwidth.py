@@ -0,0 +1,131 @@
+# coding=utf-8
+"""
+Set widths of whole wordlists for word-o-mat.
+
+A WidthTable measures every word of a list with a FontMetrics object (see
+wordmetrics) and answers width queries: the narrowest/widest words, words
+in a width range, or words closest to a target width. If NumPy is available
+the list is encoded as one array of glyph indices and measured with gather
+and cumsum operations over the whole list at once; otherwise every word is
+measured in Python.
+"""
+from bisect import bisect_left, bisect_right
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def measureWords(words, metrics):
+    """Return the widths of a list of words as a NumPy array (or a list without NumPy)."""
+    if numpy is None or not len(words):
+        return [metrics.wordWidth(w) for w in words]
+
+    words = list(words)
+    lengths = numpy.fromiter((len(w) for w in words), dtype=numpy.int64, count=len(words))
+    ends = numpy.cumsum(lengths)
+    starts = ends - lengths
+    codepoints = numpy.frombuffer("".join(words).encode("utf-32-le"), dtype=numpy.uint32)
+    if not len(codepoints):
+        return numpy.zeros(len(words))
+
+    # glyph index per character, and the advance width of every glyph index
+    uniqueCodepoints, glyphIndices = _denseCodes(codepoints)
+    chars = [chr(c) for c in uniqueCodepoints.tolist()]
+    advances = numpy.array([metrics.advance(c) for c in chars], dtype=numpy.float64)
+    widths = _sumPerWord(advances[glyphIndices], starts, ends)
+
+    # kerning of every adjacent pair inside a word; each distinct pair is looked up once
+    glyphCount = len(chars)
+    pairCodes = glyphIndices[:-1].astype(numpy.int64) * glyphCount + glyphIndices[1:]
+    uniquePairs, pairIndices = _denseCodes(pairCodes)
+    pairKerning = numpy.array([metrics.kern(chars[p // glyphCount], chars[p % glyphCount]) for p in uniquePairs.tolist()],
+                              dtype=numpy.float64)
+    kerning = numpy.append(pairKerning[pairIndices], 0.0)
+    kerning[ends[ends > 0] - 1] = 0.0  # the last character of a word has no pair inside the word
+    widths += _sumPerWord(kerning, starts, ends)
+    return widths
+
+
+def _denseCodes(codes, maxTableSize=1 << 22):
+    """Return (sorted unique codes, index of every code into them), like numpy.unique(codes, return_inverse=True).
+
+    Small code ranges use a lookup table instead of sorting.
+    """
+    if not len(codes):
+        return codes[:0], codes[:0].astype(numpy.int64)
+    size = int(codes.max()) + 1
+    if size > maxTableSize:
+        return numpy.unique(codes, return_inverse=True)
+    present = numpy.zeros(size, dtype=bool)
+    present[codes] = True
+    uniqueCodes = numpy.flatnonzero(present)
+    lookup = numpy.zeros(size, dtype=numpy.int32)
+    lookup[uniqueCodes] = numpy.arange(len(uniqueCodes))
+    return uniqueCodes, lookup[codes]
+
+
+def _sumPerWord(values, starts, ends):
+    """Sum values[start:end] for every word, using one cumulative sum."""
+    cumulative = numpy.concatenate(([0.0], numpy.cumsum(values)))
+    return cumulative[ends] - cumulative[starts]
+
+
+class WidthTable(object):
+    """Widths of all words of a list for one font master.
+
+    Attributes:
+    metrics (FontMetrics):  The metrics the widths were measured with.
+    widths (sequence):      Width of every word, by word ID.
+    order (list):           Word IDs sorted by width.
+    sortedWidths (list):    Widths in the same order.
+    nbytes (int):           Approximate memory used.
+    """
+
+    def __init__(self, words, metrics):
+        self.metrics = metrics
+        self.widths = measureWords(words, metrics)
+        if numpy is not None and isinstance(self.widths, numpy.ndarray):
+            order = numpy.argsort(self.widths, kind="stable")
+            self.order = order.tolist()
+            self.sortedWidths = self.widths[order].tolist()
+        else:
+            self.order = sorted(range(len(self.widths)), key=self.widths.__getitem__)
+            self.sortedWidths = [self.widths[i] for i in self.order]
+        self.nbytes = 16 * len(self.order)
+
+    def widthsOf(self, ids):
+        """Return the widths of the words with the given IDs, as a list."""
+        if numpy is not None and isinstance(self.widths, numpy.ndarray):
+            return self.widths[numpy.asarray(ids, dtype=numpy.int64)].tolist()
+        return [self.widths[i] for i in ids]
+
+    def narrowest(self, count):
+        """Return the IDs of the count narrowest words."""
+        return self.order[:count]
+
+    def widest(self, count):
+        """Return the IDs of the count widest words, widest first."""
+        return self.order[::-1][:count]
+
+    def inRange(self, minWidth, maxWidth):
+        """Return the IDs of the words with minWidth <= width <= maxWidth, narrowest first."""
+        start = bisect_left(self.sortedWidths, minWidth)
+        stop = bisect_right(self.sortedWidths, maxWidth)
+        return self.order[start:stop]
+
+    def nearest(self, target, count):
+        """Return the IDs of the count words whose width is closest to target, closest first."""
+        sortedWidths, order = self.sortedWidths, self.order
+        right = bisect_left(sortedWidths, target)
+        left = right - 1
+        result = []
+        while len(result) < count and (left >= 0 or right < len(order)):
+            if right >= len(order) or (left >= 0 and target - sortedWidths[left] <= sortedWidths[right] - target):
+                result.append(order[left])
+                left -= 1
+            else:
+                result.append(order[right])
+                right += 1
+        return result